@@ -0,0 +1,126 @@
+from typing import TYPE_CHECKING
+
+from gamestate.config import GameConfig
+from gamestate.game_action import (
+    DiscardAction, PlayerAction, ProtectAction, TakeAction,
+    TakeableCard, TakeableDeck, TakeableDiscard, TakeableGameObject, TakeableWager,
+)
+from gamestate.game_state import GameState
+from gamestate.neighbors import get_legal_actions
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Objects of each seat, in order: its wager, its discard pile, then one per hand slot
+WAGER_SLOT = 0
+DISCARD_SLOT = 1
+FIRST_CARD_SLOT = 2
+
+
+class ActionSpace:
+    """Numbers every action a player could name in a game with the given number of seats.
+
+    IDs are laid out as:
+        0 .. hand_slots-1                  DiscardAction(card_order)
+        hand_slots + 2*object              ProtectAction(object)
+        hand_slots + 2*object + 1          TakeAction(object)
+    where object 0 is the deck and seat s's objects follow at 1 + s*slots_per_seat. Seats are the order of
+    state.players, which only ever grows, so an ID keeps its meaning for the rest of the game.
+    """
+
+    def __init__(self, num_seats: int, config: GameConfig):
+        self.num_seats = num_seats
+        self.config = config
+        self.hand_slots = max(config.max_hand_size, config.initial_hand_size)
+        self.slots_per_seat = FIRST_CARD_SLOT + self.hand_slots
+        self.num_objects = 1 + num_seats * self.slots_per_seat
+        self.size = self.hand_slots + 2 * self.num_objects
+
+    def _object_id(self, state: GameState, obj: TakeableGameObject) -> int:
+        if obj.type == "deck":
+            return 0
+        seat = next((i for i, p in enumerate(state.players) if p.id == obj.player_id), None)
+        if seat is None:
+            raise ValueError(f"Player with id {obj.player_id} not found")
+        if obj.type == "wager":
+            slot = WAGER_SLOT
+        elif obj.type == "discard":
+            slot = DISCARD_SLOT
+        elif 0 <= obj.card_order < self.hand_slots:
+            slot = FIRST_CARD_SLOT + obj.card_order
+        else:
+            raise ValueError(f"Card order {obj.card_order} is outside the hand")
+        return 1 + seat * self.slots_per_seat + slot
+
+    def _object(self, state: GameState, object_id: int) -> TakeableGameObject:
+        if object_id == 0:
+            return TakeableDeck()
+        seat, slot = divmod(object_id - 1, self.slots_per_seat)
+        player = state.players[seat]
+        if slot == WAGER_SLOT:
+            return TakeableWager(player_id=player.id, amount=min(self.config.wager_steal, player.wager.amount))
+        if slot == DISCARD_SLOT:
+            return TakeableDiscard(player_id=player.id)
+        return TakeableCard(player_id=player.id, card_order=slot - FIRST_CARD_SLOT)
+
+    def encode(self, state: GameState, action: PlayerAction) -> int:
+        """The ID of action. A wager's amount isn't part of its ID; it is always what a take would get."""
+        if action.type == "discard":
+            if not 0 <= action.card_order < self.hand_slots:
+                raise ValueError(f"Card order {action.card_order} is outside the hand")
+            return action.card_order
+        if action.type == "protect":
+            return self.hand_slots + 2 * self._object_id(state, action.object_to_protect)
+        return self.hand_slots + 2 * self._object_id(state, action.object_to_take) + 1
+
+    def decode(self, state: GameState, action_id: int) -> PlayerAction:
+        if not 0 <= action_id < self.size:
+            raise ValueError(f"Action ID {action_id} is out of range for {self.num_seats} seats")
+        if action_id < self.hand_slots:
+            return DiscardAction(card_order=action_id)
+        object_id, take = divmod(action_id - self.hand_slots, 2)
+        obj = self._object(state, object_id)
+        return TakeAction(object_to_take=obj) if take else ProtectAction(object_to_protect=obj)
+
+    def legal_action_ids(self, state: GameState, player_id: str) -> list[int]:
+        """IDs of get_legal_actions, sorted."""
+        return sorted(self.encode(state, a) for a in get_legal_actions(state, player_id, self.config))
+
+    def legal_action_masks(self, state: GameState) -> "np.ndarray":
+        """Legal actions of every seat at once, as a (seats, size) bool array with the same rules as
+        get_legal_actions. Built from a handful of per-seat arrays, without creating any action objects."""
+        import numpy as np
+
+        n, hand_slots, k = self.num_seats, self.hand_slots, self.slots_per_seat
+        if len(state.players) != n:
+            raise ValueError(f"State has {len(state.players)} seats, not {n}")
+        alive = np.fromiter((not p.eliminated for p in state.players), dtype=bool, count=n)
+        hand_len = np.fromiter((len(p.hand.cards) for p in state.players), dtype=np.int64, count=n)
+        has_wager = np.fromiter((p.wager.amount > 0 for p in state.players), dtype=bool, count=n)
+        full = hand_len >= self.config.max_hand_size
+
+        # Which of each seat's objects exist
+        exists = np.zeros((n, k), dtype=bool)
+        exists[:, WAGER_SLOT] = has_wager
+        exists[:, DISCARD_SLOT] = True
+        exists[:, FIRST_CARD_SLOT:] = np.arange(hand_slots) < hand_len[:, None]
+
+        masks = np.zeros((n, self.size), dtype=bool)
+        masks[:, :hand_slots] = alive[:, None] & (np.arange(hand_slots) < hand_len[:, None])
+        others_alive = alive.sum() - alive > 0
+        masks[:, hand_slots] = alive
+        masks[:, hand_slots + 1] = alive & ~full & others_alive
+
+        # Actions on the seats' objects, by (player, seat, slot, protect/take)
+        objects = np.zeros((n, n, k, 2), dtype=bool)
+        seats = np.arange(n)
+        objects[seats, seats, :, 0] = exists & alive[:, None]
+        is_wager = np.arange(k) == WAGER_SLOT
+        objects[:, :, :, 1] = (
+            alive[:, None, None] & alive[None, :, None]
+            & ~np.eye(n, dtype=bool)[:, :, None]
+            & exists[None, :, :]
+            & (~full[:, None, None] | is_wager[None, None, :])
+        )
+        masks[:, hand_slots + 2:] = objects.reshape(n, -1)
+        return masks
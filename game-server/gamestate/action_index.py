@@ -0,0 +1,105 @@
+from gamestate.config import GameConfig
+from gamestate.game_action import GameAction, PlayerAction
+from gamestate.game_state import GameState
+from gamestate.metrics import LEGAL_ACTION_INDEX_LOOKUPS, LEGAL_ACTIONS_SECONDS
+from gamestate.neighbors import get_own_actions, get_take_actions
+
+
+def get_affected_players(action: GameAction) -> set[str]:
+    """Players whose objects may change when the action is resolved: every actor and every player they target."""
+    affected = set()
+    for (player_id, player_action) in action.player_actions:
+        affected.add(player_id)
+        obj = getattr(player_action, "object_to_take", None) or getattr(player_action, "object_to_protect", None)
+        target_id = getattr(obj, "player_id", None)
+        if target_id is not None:
+            affected.add(target_id)
+    return affected
+
+
+_index_miss_seconds = LEGAL_ACTIONS_SECONDS.labels(source="index_miss")
+_index_hits = LEGAL_ACTION_INDEX_LOOKUPS.labels(result="hit")
+_index_misses = LEGAL_ACTION_INDEX_LOOKUPS.labels(result="miss")
+
+
+class LegalActionIndex:
+    """Caches the legal actions of every player in one game.
+
+    Each player's own actions (protect/discard) and the actions others can take on them are cached
+    separately, so an update only regenerates the pieces belonging to affected players and a player's
+    full action set is rebuilt from cached pieces.
+    """
+
+    def __init__(self, state: GameState, config: GameConfig):
+        self.config = config
+        self.hits = 0
+        self.misses = 0
+        self._own_actions: dict[str, frozenset[PlayerAction]] = {}
+        self._take_actions: dict[tuple[str, bool], frozenset[PlayerAction]] = {}
+        self._legal_actions: dict[str, frozenset[PlayerAction]] = {}
+        self._set_state(state)
+
+    def _set_state(self, state: GameState):
+        self.state = state
+        self._players = {p.id: p for p in state.players}
+
+    def update(self, state: GameState, action: GameAction | None = None):
+        """Moves the index to a new state of the same game.
+
+        With an action, only the players it affects are invalidated. Without one (e.g. a player joining),
+        players that are new or whose objects changed are invalidated.
+        """
+        if action is not None:
+            affected = get_affected_players(action)
+        else:
+            affected = {p.id for p in state.players if self._players.get(p.id) != p}
+        self._set_state(state)
+        for player_id in affected:
+            self._own_actions.pop(player_id, None)
+            self._take_actions.pop((player_id, False), None)
+            self._take_actions.pop((player_id, True), None)
+        if affected:
+            # Every player's full set includes the take actions on the affected players
+            self._legal_actions.clear()
+
+    def legal_actions(self, player_id: str) -> frozenset[PlayerAction]:
+        legal_actions = self._legal_actions.get(player_id)
+        if legal_actions is not None:
+            self.hits += 1
+            _index_hits.inc()
+            return legal_actions
+        self.misses += 1
+        _index_misses.inc()
+        with _index_miss_seconds.time():
+            legal_actions = self._compute(player_id)
+        self._legal_actions[player_id] = legal_actions
+        return legal_actions
+
+    def _compute(self, player_id: str) -> frozenset[PlayerAction]:
+        player = self._players.get(player_id)
+        if player is None or player.eliminated:
+            return frozenset()
+        hand_full = len(player.hand.cards) >= self.config.max_hand_size
+        combined = set(self._get_own_actions(player_id))
+        for other_player in self.state.players:
+            if other_player.id == player_id or other_player.eliminated:
+                continue
+            combined.update(self._get_take_actions(other_player.id, hand_full))
+        return frozenset(combined)
+
+    def is_legal(self, player_id: str, action: PlayerAction) -> bool:
+        return action in self.legal_actions(player_id)
+
+    def _get_own_actions(self, player_id: str) -> frozenset[PlayerAction]:
+        own_actions = self._own_actions.get(player_id)
+        if own_actions is None:
+            own_actions = frozenset(get_own_actions(self._players[player_id], self.config))
+            self._own_actions[player_id] = own_actions
+        return own_actions
+
+    def _get_take_actions(self, target_id: str, hand_full: bool) -> frozenset[PlayerAction]:
+        take_actions = self._take_actions.get((target_id, hand_full))
+        if take_actions is None:
+            take_actions = frozenset(get_take_actions(self._players[target_id], self.config, hand_full))
+            self._take_actions[(target_id, hand_full)] = take_actions
+        return take_actions
@@ -0,0 +1,138 @@
+"""Monte Carlo batches of self-play games across a process pool.
+
+Games are sharded by seed, so a batch is reproducible regardless of the number of processes. Run from the
+game-server directory, overriding any GameConfig field:
+
+    python -m gamestate.batch --games 100000 --players 3 --processes 8 --blind 2 --wager_steal 2
+"""
+from dataclasses import asdict, dataclass, field, fields
+from multiprocessing import Pool
+from typing import Any, Iterable, Iterator
+import argparse
+import json
+import os
+
+from gamestate.config import GameConfig
+from gamestate.simulate import GameResult, play_game
+
+
+@dataclass
+class BatchStats:
+    num_players: int
+    games: int = 0
+    total_turns: int = 0
+    wins_by_seat: list[int] = field(default_factory=list)
+    end_reasons: dict[str, int] = field(default_factory=dict)
+    # Type of the protected object a player tried to take when they were eliminated
+    elimination_causes: dict[str, int] = field(default_factory=dict)
+
+    def __post_init__(self):
+        if not self.wins_by_seat:
+            self.wins_by_seat = [0] * self.num_players
+
+    def add(self, result: GameResult):
+        self.games += 1
+        self.total_turns += result.turns
+        seat = result.winner_seat
+        if seat is not None:
+            self.wins_by_seat[seat] += 1
+        self.end_reasons[result.end_reason] = self.end_reasons.get(result.end_reason, 0) + 1
+        for (_, cause) in result.eliminations:
+            self.elimination_causes[cause] = self.elimination_causes.get(cause, 0) + 1
+
+    def merge(self, other: "BatchStats"):
+        self.games += other.games
+        self.total_turns += other.total_turns
+        self.wins_by_seat = [a + b for a, b in zip(self.wins_by_seat, other.wins_by_seat)]
+        for reason, count in other.end_reasons.items():
+            self.end_reasons[reason] = self.end_reasons.get(reason, 0) + count
+        for cause, count in other.elimination_causes.items():
+            self.elimination_causes[cause] = self.elimination_causes.get(cause, 0) + count
+
+    @property
+    def win_rates_by_seat(self) -> list[float]:
+        return [wins / self.games if self.games else 0.0 for wins in self.wins_by_seat]
+
+    @property
+    def average_length(self) -> float:
+        return self.total_turns / self.games if self.games else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            **asdict(self),
+            "win_rates_by_seat": self.win_rates_by_seat,
+            "average_length": self.average_length,
+        }
+
+
+def shard_seeds(seeds: range, shard_size: int) -> list[range]:
+    return [seeds[i:i + shard_size] for i in range(0, len(seeds), shard_size)]
+
+def _play_one(args: tuple[GameConfig, int, int, int]) -> GameResult:
+    config, num_players, seed, max_turns = args
+    result = play_game(config, num_players, seed, max_turns=max_turns)
+    # Latencies aren't meaningful across processes and would dominate the result size
+    result.turn_latencies_ns = []
+    return result
+
+def _play_shard(args: tuple[GameConfig, int, range, int]) -> BatchStats:
+    config, num_players, seeds, max_turns = args
+    stats = BatchStats(num_players=num_players)
+    for seed in seeds:
+        stats.add(play_game(config, num_players, seed, max_turns=max_turns))
+    return stats
+
+def iter_results(
+    config: GameConfig,
+    num_players: int,
+    seeds: range,
+    processes: int | None = None,
+    chunksize: int = 64,
+    max_turns: int = 1000,
+) -> Iterator[GameResult]:
+    """Yields the result of every game as soon as it finishes, in no particular order."""
+    with Pool(processes) as pool:
+        yield from pool.imap_unordered(_play_one, ((config, num_players, seed, max_turns) for seed in seeds), chunksize)
+
+def iter_shard_stats(
+    config: GameConfig,
+    num_players: int,
+    seeds: range,
+    processes: int | None = None,
+    shard_size: int = 1000,
+    max_turns: int = 1000,
+) -> Iterator[BatchStats]:
+    """Yields aggregate statistics per shard of seeds as each shard finishes.
+
+    Cheaper than iter_results for large batches since only one small object per shard crosses processes.
+    """
+    shards = shard_seeds(seeds, shard_size)
+    with Pool(processes) as pool:
+        yield from pool.imap_unordered(_play_shard, ((config, num_players, shard, max_turns) for shard in shards))
+
+def merge_stats(num_players: int, stats: Iterable[BatchStats]) -> BatchStats:
+    total = BatchStats(num_players=num_players)
+    for s in stats:
+        total.merge(s)
+    return total
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=10_000)
+    parser.add_argument("--players", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game; game i uses seed + i")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--shard-size", type=int, default=1000)
+    parser.add_argument("--max-turns", type=int, default=1000)
+    defaults = GameConfig()
+    for f in fields(GameConfig):
+        parser.add_argument(f"--{f.name}", type=f.type, default=getattr(defaults, f.name))
+    args = parser.parse_args(argv)
+
+    config = GameConfig(**{f.name: getattr(args, f.name) for f in fields(GameConfig)})
+    seeds = range(args.seed, args.seed + args.games)
+    stats = merge_stats(args.players, iter_shard_stats(config, args.players, seeds, args.processes, args.shard_size, args.max_turns))
+    print(json.dumps({"config": asdict(config), **stats.to_dict()}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Throughput benchmark for the rules engine.
+
+Plays complete random games for each config preset and player count and prints the results as JSON,
+so runs from different commits can be compared. Run from the game-server directory:
+
+    python -m gamestate.benchmark --games 50 --players 2 4 --output bench.json
+
+Every turn of the replayed games is also resolved with the other state backend, and the run fails if the
+two disagree or a state doesn't survive conversion to gamestate.compact and back.
+"""
+from dataclasses import asdict
+from collections import Counter
+from math import comb
+from pathlib import Path
+from typing import Any, Iterable
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from gamestate.config import GameConfig
+from gamestate.game_action import GameAction
+from gamestate.game_state import GameState
+from gamestate.compact import from_compact, to_compact
+from gamestate.perform import Backend, get_possible_results, perform_random_action
+from gamestate.simulate import play_game
+
+PRESETS: dict[str, GameConfig] = {
+    "default": GameConfig(),
+    "small": GameConfig(num_suits=2, num_ranks=6, max_hand_size=3),
+    "large": GameConfig(num_suits=8, num_ranks=20, initial_hand_size=3, max_hand_size=7),
+}
+
+# Outcome sets bigger than this are counted instead of enumerated
+MAX_ENUMERATED_OUTCOMES = 20_000
+
+
+def load_presets(config_path: str) -> dict[str, GameConfig]:
+    presets = dict(PRESETS)
+    if Path(config_path).exists():
+        import yaml
+        with open(config_path) as f:
+            presets[config_path] = GameConfig(**yaml.safe_load(f)["game"])
+    return presets
+
+def count_outcomes(state: GameState, action: GameAction) -> int:
+    """Size of get_possible_results(state, action).
+
+    Deck draws are the only branching step. Copies of a card from other decks lead to the same state, so
+    the outcomes are the distinct sequences of card values the takers can draw. Small sets are enumerated
+    with get_possible_results as a cross-check.
+    """
+    deck_takers = sum(
+        1 for (_, a) in action.player_actions
+        if a.type == "take" and a.object_to_take.type == "deck"
+    )
+    protected = any(
+        a.type == "protect" and a.object_to_protect.type == "deck"
+        for (_, a) in action.player_actions
+    )
+    bound = 1 if protected else count_draw_sequences(Counter(state.deck.cards).values(), deck_takers)
+    if bound > MAX_ENUMERATED_OUTCOMES:
+        return bound
+    return len(get_possible_results(state, action))
+
+def count_draw_sequences(copies: Iterable[int], length: int) -> int:
+    """Number of distinct sequences of length cards drawn from a deck holding the given number of copies of each card."""
+    # sequences[j]: sequences of length j using the cards seen so far
+    sequences = [1] + [0] * length
+    for n in copies:
+        sequences = [
+            sum(sequences[j - t] * comb(j, t) for t in range(min(n, j) + 1))
+            for j in range(length + 1)
+        ]
+    return sequences[length]
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def check_backends(state: GameState, action: GameAction, next_state: GameState, backend: Backend):
+    """Raises AssertionError if the backends disagree on a turn that backend resolved to next_state."""
+    assert from_compact(to_compact(state)) == state, "State changed converting to compact and back"
+    other: Backend = "compact" if backend == "dataclass" else "dataclass"
+    assert perform_random_action(state, action, backend=other) == next_state, "Backends resolved a turn differently"
+    assert perform_random_action(state, action, random.Random(0), backend=other) == perform_random_action(state, action, random.Random(0), backend=backend), \
+        "Backends drew different cards with the same rng"
+
+def run_preset(name: str, config: GameConfig, num_players: int, games: int, seed: int, alloc_games: int, backend: Backend = "dataclass") -> dict[str, Any]:
+    latencies: list[int] = []
+    peak_outcomes = 0
+    turns = 0
+    end_reasons: dict[str, int] = {}
+
+    start = time.perf_counter()
+    for i in range(games):
+        result = play_game(config, num_players, seed + i, backend=backend)
+        latencies.extend(result.turn_latencies_ns)
+        turns += result.turns
+        end_reasons[result.end_reason] = end_reasons.get(result.end_reason, 0) + 1
+    elapsed = time.perf_counter() - start
+
+    # Outcome counting and allocation tracing would distort the timings, so they replay the same seeds separately
+    alloc_peaks: list[int] = []
+    for i in range(games):
+        turn_log: list[tuple[GameState, GameAction]] = []
+
+        def on_turn(state: GameState, action: GameAction, next_state: GameState):
+            nonlocal peak_outcomes
+            peak_outcomes = max(peak_outcomes, count_outcomes(state, action))
+            check_backends(state, action, next_state, backend)
+            turn_log.append((state, action))
+
+        play_game(config, num_players, seed + i, on_turn=on_turn, backend=backend)
+        if i < alloc_games:
+            alloc_peaks.extend(measure_allocations(turn_log, backend))
+
+    latencies.sort()
+    alloc_peaks.sort()
+    return {
+        "preset": name,
+        "backend": backend,
+        "config": asdict(config),
+        "players": num_players,
+        "games": games,
+        "seed": seed,
+        "turns": turns,
+        "end_reasons": end_reasons,
+        "turns_per_sec": turns / elapsed if elapsed > 0 else 0.0,
+        "turn_latency_p50_us": percentile(latencies, 0.5) / 1000,
+        "turn_latency_p99_us": percentile(latencies, 0.99) / 1000,
+        "peak_outcomes": peak_outcomes,
+        "turn_alloc_peak_bytes_mean": sum(alloc_peaks) / len(alloc_peaks) if alloc_peaks else 0.0,
+        "turn_alloc_peak_bytes_p99": percentile(alloc_peaks, 0.99),
+    }
+
+def measure_allocations(turn_log: list[tuple[GameState, GameAction]], backend: Backend = "dataclass") -> list[int]:
+    """Peak bytes allocated while resolving each logged turn."""
+    peaks = []
+    rng = random.Random(0)
+    tracemalloc.start()
+    try:
+        for state, action in turn_log:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            perform_random_action(state, action, rng, backend)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=20, help="games per preset and player count")
+    parser.add_argument("--players", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game; game i uses seed + i")
+    parser.add_argument("--presets", nargs="+", help="preset names to run (default: all)")
+    parser.add_argument("--config", default="config.yaml", help="also benchmark the game section of this file")
+    parser.add_argument("--alloc-games", type=int, default=5, help="games per run to trace allocations for")
+    parser.add_argument("--backend", choices=["dataclass", "compact"], default="dataclass", help="state backend to resolve turns with")
+    parser.add_argument("--output", default="-", help="file to write the JSON results to (default: stdout)")
+    args = parser.parse_args(argv)
+
+    presets = load_presets(args.config)
+    names = args.presets or list(presets)
+    results = [
+        run_preset(name, presets[name], num_players, args.games, args.seed, args.alloc_games, args.backend)
+        for name in names
+        for num_players in args.players
+    ]
+    output = json.dumps({"python": sys.version.split()[0], "results": results}, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        Path(args.output).write_text(output + "\n")
+
+if __name__ == "__main__":
+    main()
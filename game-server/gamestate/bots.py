@@ -0,0 +1,167 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import math
+import random
+import time
+
+from gamestate.config import GameConfig
+from gamestate.evaluate import HandRank, get_hand_evaluator, is_terminal_state
+from gamestate.game_action import GameAction, PlayerAction
+from gamestate.game_state import GameState
+from gamestate.perform import sample_result
+from gamestate.simulate import playable_actions
+
+
+@dataclass
+class ActionStats:
+    visits: int = 0
+    total_value: float = 0.0
+
+@dataclass
+class SearchNode:
+    """Statistics for one state. Each player picks their own action independently (decoupled UCT),
+    since all players act simultaneously."""
+    actions: dict[str, list[PlayerAction]]
+    stats: dict[str, dict[PlayerAction, ActionStats]] = field(default_factory=dict)
+    visits: int = 0
+
+
+class TranspositionTable:
+    """Bounded map from game states to search nodes, evicting the least recently used. An entry takes
+    around 11KB (the state, its playable actions and their statistics)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[GameState, SearchNode] = OrderedDict()
+
+    def get(self, state: GameState) -> SearchNode | None:
+        node = self._entries.get(state)
+        if node is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(state)
+        return node
+
+    def put(self, state: GameState, node: SearchNode):
+        self._entries[state] = node
+        self._entries.move_to_end(state)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __contains__(self, state: GameState) -> bool:
+        return state in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def evaluate_state(state: GameState, config: GameConfig) -> dict[str, float]:
+    """Heuristic value in [0, 1] of the state for every player.
+
+    Eliminated players get 0 and the last player standing gets 1. Otherwise a player's value mixes their
+    share of the chips left at the table with the category of their current hand.
+    """
+    alive = [p for p in state.players if not p.eliminated]
+    values = {p.id: 0.0 for p in state.players}
+    if len(alive) == 1:
+        values[alive[0].id] = 1.0
+        return values
+    evaluator = get_hand_evaluator(config)
+    total_chips = sum(p.stack.value + p.wager.amount for p in alive) or 1
+    for p in alive:
+        hand_strength = evaluator.evaluate(p.hand)[0] / HandRank.STRAIGHT_FLUSH
+        values[p.id] = 0.7 * (p.stack.value + p.wager.amount) / total_chips + 0.3 * hand_strength
+    return values
+
+
+class MCTSBot:
+    """Picks actions with simultaneous-move Monte Carlo tree search under a per-move time budget.
+
+    The tree lives in a transposition table keyed by GameState, so positions reached through different
+    joint actions share statistics, and the table is kept between moves. Usable as a simulate.Policy.
+    """
+
+    def __init__(
+        self,
+        config: GameConfig,
+        time_budget: float = 0.25,
+        max_depth: int = 6,
+        table_size: int = 4096,
+        exploration: float = 1.4,
+        seed: int | None = None,
+    ):
+        self.config = config
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.exploration = exploration
+        self.table = TranspositionTable(table_size)
+        self.rng = random.Random(seed)
+
+    def __call__(self, state: GameState, player_id: str, config: GameConfig, rng: random.Random) -> PlayerAction:
+        return self.choose_action(state, player_id)
+
+    def choose_action(self, state: GameState, player_id: str, max_iterations: int | None = None) -> PlayerAction:
+        deadline = time.perf_counter() + self.time_budget
+        iterations = 0
+        while time.perf_counter() < deadline and (max_iterations is None or iterations < max_iterations):
+            self._iterate(state)
+            iterations += 1
+        root = self._node(state)
+        stats = root.stats.get(player_id, {})
+        if not stats:
+            return self.rng.choice(root.actions[player_id])
+        return max(stats, key=lambda action: stats[action].visits)
+
+    def _node(self, state: GameState) -> SearchNode:
+        node = self.table.get(state)
+        if node is None:
+            node = SearchNode(actions={
+                p.id: playable_actions(state, p.id, self.config)
+                for p in state.players
+                if not p.eliminated
+            })
+            self.table.put(state, node)
+        return node
+
+    def _select(self, node: SearchNode, player_id: str) -> PlayerAction:
+        stats = node.stats.setdefault(player_id, {})
+        untried = [a for a in node.actions[player_id] if a not in stats]
+        if untried:
+            return self.rng.choice(untried)
+        log_visits = math.log(node.visits + 1)
+        return max(
+            stats,
+            key=lambda a: stats[a].total_value / stats[a].visits + self.exploration * math.sqrt(log_visits / stats[a].visits),
+        )
+
+    def _iterate(self, state: GameState):
+        path: list[tuple[SearchNode, GameAction]] = []
+        for _ in range(self.max_depth):
+            if is_terminal_state(state):
+                break
+            is_new = state not in self.table
+            node = self._node(state)
+            action = GameAction(player_actions=tuple(
+                (player_id, self._select(node, player_id))
+                for player_id in node.actions
+            ))
+            try:
+                next_state = sample_result(state, action, self.rng)
+            except ValueError:
+                # The joint action can't be resolved, e.g. more deck draws than cards left
+                break
+            path.append((node, action))
+            state = next_state
+            if is_new:
+                break
+
+        values = evaluate_state(state, self.config)
+        for node, action in path:
+            node.visits += 1
+            for (player_id, player_action) in action.player_actions:
+                stats = node.stats[player_id].setdefault(player_action, ActionStats())
+                stats.visits += 1
+                stats.total_value += values[player_id]
@@ -0,0 +1,277 @@
+from dataclasses import dataclass, field, replace
+import random
+
+from gamestate.game_action import DiscardAction, GameAction, ProtectAction, TakeAction
+from gamestate.game_state import Card, Deck, DiscardPile, GameState, Hand, NotProtectableCard, Player, Stack, Wager
+
+# Cards are packed into a single int: suit and rank in the high bits, the temporary card flags in the low bits.
+CARD_PROTECTED = 1
+CARD_GONE = 2
+_CARD_FLAG_BITS = 2
+_RANK_BITS = 16
+_RANK_MASK = (1 << _RANK_BITS) - 1
+_CARD_FLAGS = CARD_PROTECTED | CARD_GONE
+
+# Per-player flags
+HAND_PROTECTED = 1
+DISCARD_PROTECTED = 2
+WAGER_PROTECTED = 4
+ELIMINATED = 8
+TEMPORARY_FLAGS = HAND_PROTECTED | DISCARD_PROTECTED | WAGER_PROTECTED
+
+
+def encode_card(suit: int, rank: int, protected: bool = False, gone: bool = False) -> int:
+    return (
+        (((suit << _RANK_BITS) | rank) << _CARD_FLAG_BITS)
+        | (CARD_PROTECTED if protected else 0)
+        | (CARD_GONE if gone else 0)
+    )
+
+def card_suit(code: int) -> int:
+    return code >> (_RANK_BITS + _CARD_FLAG_BITS)
+
+def card_rank(code: int) -> int:
+    return (code >> _CARD_FLAG_BITS) & _RANK_MASK
+
+def decode_card(code: int) -> Card:
+    return Card(
+        suit=card_suit(code),
+        rank=card_rank(code),
+        protected=bool(code & CARD_PROTECTED),
+        _gone=bool(code & CARD_GONE),
+    )
+
+
+@dataclass(eq=True, frozen=True, slots=True)
+class CompactPlayer:
+    id: str
+    hand: tuple[int, ...]
+    discard_pile: tuple[int, ...]
+    stack: float
+    wager: float
+    flags: int = 0
+
+@dataclass(eq=True, frozen=True, slots=True)
+class CompactGameState:
+    players: tuple[CompactPlayer, ...]
+    deck: tuple[int, ...]
+    deck_protected: bool = False
+    # Bitmask of player indices touched since flags were last cleared, so clearing only rebuilds those players.
+    dirty: int = field(default=0, compare=False)
+
+
+def to_compact(state: GameState) -> CompactGameState:
+    """The compact form of state. from_compact(to_compact(state)) == state, flags set mid-turn included."""
+    players = []
+    dirty = 0
+    for i, p in enumerate(state.players):
+        flags = (
+            (HAND_PROTECTED if p.hand.protected else 0)
+            | (DISCARD_PROTECTED if p.discard_pile.protected else 0)
+            | (WAGER_PROTECTED if p.wager.protected else 0)
+            | (ELIMINATED if p.eliminated else 0)
+        )
+        hand = tuple(encode_card(c.suit, c.rank, c.protected, c._gone) for c in p.hand.cards)
+        if flags & TEMPORARY_FLAGS or any(code & _CARD_FLAGS for code in hand):
+            dirty |= 1 << i
+        players.append(CompactPlayer(
+            id=p.id,
+            hand=hand,
+            discard_pile=tuple(encode_card(c.suit, c.rank, c.protected, c._gone) for c in p.discard_pile.cards),
+            stack=p.stack.value,
+            wager=p.wager.amount,
+            flags=flags,
+        ))
+    return CompactGameState(
+        players=tuple(players),
+        deck=tuple(encode_card(c.suit, c.rank) for c in state.deck.cards),
+        deck_protected=state.deck.protected,
+        dirty=dirty,
+    )
+
+def from_compact(state: CompactGameState) -> GameState:
+    """The game_state form of state. The deck comes back as a new Shoe holding the same cards in the same order."""
+    return GameState(
+        players=tuple(
+            Player(
+                id=p.id,
+                hand=Hand(cards=tuple(decode_card(c) for c in p.hand), protected=bool(p.flags & HAND_PROTECTED)),
+                discard_pile=DiscardPile(cards=tuple(decode_card(c) for c in p.discard_pile), protected=bool(p.flags & DISCARD_PROTECTED)),
+                stack=Stack(value=p.stack),
+                wager=Wager(amount=p.wager, protected=bool(p.flags & WAGER_PROTECTED)),
+                eliminated=bool(p.flags & ELIMINATED),
+            )
+            for p in state.players
+        ),
+        deck=Deck(
+            cards=tuple(NotProtectableCard(suit=card_suit(c), rank=card_rank(c)) for c in state.deck),
+            protected=state.deck_protected,
+        ),
+    )
+
+
+def find_player_index(state: CompactGameState, player_id: str) -> int:
+    for i, p in enumerate(state.players):
+        if p.id == player_id:
+            return i
+    raise ValueError(f"Player with id {player_id} not found")
+
+def with_player(state: CompactGameState, index: int, player: CompactPlayer) -> CompactGameState:
+    """Returns a copy of the state where only the player at the given index is replaced."""
+    return replace(state,
+        players=state.players[:index] + (player,) + state.players[index + 1:],
+        dirty=state.dirty | (1 << index),
+    )
+
+def eliminate_player(state: CompactGameState, index: int) -> CompactGameState:
+    player = state.players[index]
+    return with_player(state, index, replace(player, flags=player.flags | ELIMINATED))
+
+def clear_temporary_flags(state: CompactGameState) -> CompactGameState:
+    if not state.dirty and not state.deck_protected:
+        return state
+    players = list(state.players)
+    for i, p in enumerate(players):
+        if state.dirty & (1 << i):
+            players[i] = replace(p,
+                hand=tuple(c & ~_CARD_FLAGS for c in p.hand if not c & CARD_GONE),
+                flags=p.flags & ~TEMPORARY_FLAGS,
+            )
+    return CompactGameState(players=tuple(players), deck=state.deck, deck_protected=False, dirty=0)
+
+
+def perform_protect(state: CompactGameState, player_id: str, action: ProtectAction) -> CompactGameState:
+    obj = action.object_to_protect
+    if obj.type == "deck":
+        return replace(state, deck_protected=True)
+    index = find_player_index(state, obj.player_id)
+    player = state.players[index]
+    if obj.type == "card":
+        if not 0 <= obj.card_order < len(player.hand):
+            raise ValueError(f"Player {player.id} does not have a card at order {obj.card_order}")
+        hand = list(player.hand)
+        hand[obj.card_order] |= CARD_PROTECTED
+        return with_player(state, index, replace(player, hand=tuple(hand)))
+    elif obj.type == "wager":
+        return with_player(state, index, replace(player, flags=player.flags | WAGER_PROTECTED))
+    elif obj.type == "discard":
+        return with_player(state, index, replace(player, flags=player.flags | DISCARD_PROTECTED))
+    else:
+        raise ValueError(f"Unknown object to protect type: {obj.type}")
+
+def take_from_deck(state: CompactGameState, index: int, position: int) -> CompactGameState:
+    """Moves the card at position in the deck to the hand of the player at index."""
+    player = state.players[index]
+    return replace(
+        with_player(state, index, replace(player, hand=player.hand + (state.deck[position],))),
+        deck=state.deck[:position] + state.deck[position + 1:],
+    )
+
+def perform_take(state: CompactGameState, player_id: str, action: TakeAction) -> set[CompactGameState]:
+    index = find_player_index(state, player_id)
+    player = state.players[index]
+    if player.flags & ELIMINATED:
+        return {state}
+    obj = action.object_to_take
+    if obj.type == "deck":
+        if state.deck_protected:
+            return {eliminate_player(state, index)}
+        if len(state.deck) == 0:
+            raise ValueError("Cannot take from an empty deck")
+        # Copies of a card from other decks lead to the same state as the first one
+        first_positions = {}
+        for position, card in enumerate(state.deck):
+            first_positions.setdefault(card, position)
+        return {take_from_deck(state, index, position) for position in first_positions.values()}
+
+    target_index = find_player_index(state, obj.player_id)
+    target = state.players[target_index]
+    if obj.type == "card":
+        card = target.hand[obj.card_order]
+        if target.flags & HAND_PROTECTED or card & CARD_PROTECTED:
+            return {eliminate_player(state, index)}
+        if card & CARD_GONE:
+            # Other player already discarded this card
+            return {state}
+        hand = list(target.hand)
+        hand[obj.card_order] = card | CARD_GONE
+        state = with_player(state, target_index, replace(target, hand=tuple(hand)))
+        return {with_player(state, index, replace(player, hand=player.hand + (card,)))}
+    elif obj.type == "wager":
+        if target.flags & WAGER_PROTECTED:
+            return {eliminate_player(state, index)}
+        state = with_player(state, index, replace(player, stack=player.stack + obj.amount))
+        return {with_player(state, target_index, replace(target, wager=target.wager - obj.amount))}
+    elif obj.type == "discard":
+        if target.flags & DISCARD_PROTECTED:
+            return {eliminate_player(state, index)}
+        if len(target.discard_pile) == 0:
+            raise ValueError(f"Player {target.id} has no cards in their discard pile to take")
+        card = target.discard_pile[0] # Only allow drawing the top card of the discard pile
+        state = with_player(state, index, replace(player, hand=player.hand + (card,)))
+        return {with_player(state, target_index, replace(target, discard_pile=tuple(c for c in target.discard_pile if c != card)))}
+    else:
+        raise ValueError(f"Unknown object to take type: {obj.type}")
+
+def perform_discard(state: CompactGameState, player_id: str, action: DiscardAction) -> CompactGameState:
+    index = find_player_index(state, player_id)
+    player = state.players[index]
+    if player.flags & ELIMINATED:
+        return state
+    if action.card_order < 0 or action.card_order >= len(player.hand):
+        raise ValueError(f"Player {player.id} does not have a card at order {action.card_order} to discard")
+    card = player.hand[action.card_order]
+    # Other player already took this card
+    if card & CARD_GONE:
+        return state
+    hand = list(player.hand)
+    hand[action.card_order] = card | CARD_GONE
+    return with_player(state, index, replace(player,
+        hand=tuple(hand),
+        discard_pile=(card,) + player.discard_pile, # Discarded cards go on top of the pile
+    ))
+
+
+def get_possible_results(state: CompactGameState, action: GameAction) -> set[CompactGameState]:
+    """Compact counterpart of gamestate.perform.get_possible_results."""
+    current_possible_gamestates = {state}
+    for (player_id, player_action) in action.player_actions:
+        if player_action.type == "protect":
+            current_possible_gamestates = {perform_protect(s, player_id, player_action) for s in current_possible_gamestates}
+    for (player_id, player_action) in action.player_actions:
+        if player_action.type == "take":
+            new_current_possible_gamestates = set()
+            for s in current_possible_gamestates:
+                new_current_possible_gamestates.update(perform_take(s, player_id, player_action))
+            current_possible_gamestates = new_current_possible_gamestates
+    for (player_id, player_action) in action.player_actions:
+        if player_action.type == "discard":
+            current_possible_gamestates = {perform_discard(s, player_id, player_action) for s in current_possible_gamestates}
+
+    assert len(current_possible_gamestates) > 0, "Impossible action for state"
+
+    return {clear_temporary_flags(s) for s in current_possible_gamestates}
+
+def sample_result(state: CompactGameState, action: GameAction, rng: random.Random | None = None) -> CompactGameState:
+    """Compact counterpart of gamestate.perform.sample_result. Given the same state, action and rng state it
+    draws the same cards."""
+    for phase in ("protect", "take", "discard"):
+        for (player_id, player_action) in action.player_actions:
+            if player_action.type != phase:
+                continue
+            if phase == "protect":
+                state = perform_protect(state, player_id, player_action)
+            elif phase == "discard":
+                state = perform_discard(state, player_id, player_action)
+            elif player_action.object_to_take.type == "deck" and not state.deck_protected:
+                index = find_player_index(state, player_id)
+                if state.players[index].flags & ELIMINATED:
+                    continue
+                if len(state.deck) == 0:
+                    raise ValueError("Cannot take from an empty deck")
+                # Off the top without an rng, otherwise the first copy of a uniformly drawn card
+                position = 0 if rng is None else state.deck.index(rng.choice(state.deck))
+                state = take_from_deck(state, index, position)
+            else:
+                (state,) = perform_take(state, player_id, player_action)
+    return clear_temporary_flags(state)
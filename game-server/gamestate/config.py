@@ -10,4 +10,6 @@ class GameConfig:
     initial_stack: float = 20
     blind: float = 4
     wager_steal: float = 1
+    # Full decks shuffled together into one shoe
+    num_decks: int = 1
 
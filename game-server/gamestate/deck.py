@@ -0,0 +1,89 @@
+from typing import Sequence
+import random
+import threading
+
+from gamestate.config import GameConfig
+from gamestate.game_state import NotProtectableCard, Shoe
+
+
+class ShuffledCards(Sequence[NotProtectableCard]):
+    """A uniformly shuffled order of num_decks full decks, computed lazily.
+
+    The Fisher-Yates shuffle only runs as far as the positions that have been looked at, keeping the
+    untouched part of the deck as a sparse map of swaps. Dealing k cards from a deck of any size is O(k),
+    and the same seed always gives the same order.
+    """
+
+    def __init__(self, num_suits: int, num_ranks: int, num_decks: int, rng: random.Random):
+        self.num_suits = num_suits
+        self.num_ranks = num_ranks
+        self.size = num_suits * num_ranks * num_decks
+        self._rng = rng
+        self._order: list[int] = []
+        self._swaps: dict[int, int] = {}
+        self._cards: dict[int, NotProtectableCard] = {}
+        # States of the same game are read from several threads (e.g. bots thinking)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getstate__(self):
+        # Locks can't be pickled, e.g. to send a state to a process pool
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _extend(self, position: int):
+        with self._lock:
+            order, swaps, size = self._order, self._swaps, self.size
+            while len(order) <= position:
+                i = len(order)
+                j = self._rng.randrange(i, size)
+                card = swaps.get(j, j)
+                displaced = swaps.pop(i, i)
+                if j != i:
+                    swaps[j] = displaced
+                order.append(card)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return tuple(self[i] for i in range(*position.indices(self.size)))
+        if position < 0:
+            position += self.size
+        if not 0 <= position < self.size:
+            raise IndexError("Deck position out of range")
+        if position >= len(self._order):
+            self._extend(position)
+        index = self._order[position] % (self.num_suits * self.num_ranks)
+        card = self._cards.get(index)
+        if card is None:
+            suit, rank = divmod(index, self.num_ranks)
+            # Copies of a card from different decks are the same value, so one object serves them all
+            card = self._cards.setdefault(index, NotProtectableCard(suit=suit + 1, rank=rank + 1))
+        return card
+
+
+def create_shoe(config: GameConfig, rng: random.Random | None = None) -> Shoe:
+    """A freshly shuffled shoe for one game, seeded from rng (or unseeded without one).
+
+    The shuffle is lazy, so the shoe gets a generator of its own: reading the deck must not draw from
+    rng, which the caller may go on using, e.g. for players' policies.
+    """
+    seed = rng.getrandbits(64) if rng is not None else None
+    return Shoe(ShuffledCards(config.num_suits, config.num_ranks, config.num_decks, random.Random(seed)))
+
+
+def deal(shoe: Shoe, count: int, rng: random.Random | None = None) -> tuple[tuple[NotProtectableCard, ...], Shoe]:
+    """Deals count cards off the top of the shoe, or uniformly from anywhere in it with an rng."""
+    if count > len(shoe):
+        raise ValueError("Not enough cards in deck to deal the requested hand size.")
+    dealt = []
+    for _ in range(count):
+        card, shoe = shoe.draw() if rng is None else shoe.pop(rng.randrange(len(shoe)))
+        dealt.append(card)
+    return tuple(dealt), shoe
@@ -1,4 +1,175 @@
-from gamestate.game_state import GameState
+from collections import Counter
+from dataclasses import astuple
+from enum import IntEnum
+from itertools import combinations_with_replacement
+from typing import TYPE_CHECKING, Sequence
+
+from gamestate.config import GameConfig
+from gamestate.game_state import GameState, Hand
+
+if TYPE_CHECKING:
+    import numpy as np
 
 def is_terminal_state(state: GameState) -> bool:
     return sum(1 for player in state.players if not player.eliminated) <= 1
+
+
+class HandRank(IntEnum):
+    HIGH_CARD = 1
+    PAIR = 2
+    TWO_PAIR = 3
+    THREE_OF_A_KIND = 4
+    STRAIGHT = 5
+    FLUSH = 6
+    FULL_HOUSE = 7
+    FOUR_OF_A_KIND = 8
+    STRAIGHT_FLUSH = 9
+
+
+def rank_hand(ranks: Sequence[int], flush: bool) -> tuple[HandRank, tuple[int, ...]]:
+    """Ranks a whole hand (not a best five) the same way as the client's poker_hand_evaluate.ts.
+
+    Ranks compare numerically. Flushes and straights need at least three cards, and a straight is every
+    rank distinct and consecutive. Tiebreakers list ranks by how many of them there are, then by rank.
+    """
+    counts = Counter(ranks)
+    grouped = sorted(counts, key=lambda r: (counts[r], r), reverse=True)
+    top_counts = sorted(counts.values(), reverse=True) + [0, 0]
+    descending = tuple(sorted(ranks, reverse=True))
+
+    if len(ranks) >= 3:
+        # Aces are rank 1 and play low, like everywhere else: A-2-3-4-5 is the lowest straight, topped by
+        # the 5, and no straight wraps around from the top rank to the ace
+        straight = len(counts) == len(ranks) and descending[0] - descending[-1] == len(ranks) - 1
+        if straight and flush:
+            return HandRank.STRAIGHT_FLUSH, (descending[0],)
+        if top_counts[0] >= 4:
+            return HandRank.FOUR_OF_A_KIND, tuple(grouped)
+        if top_counts[0] >= 3 and top_counts[1] >= 2:
+            return HandRank.FULL_HOUSE, tuple(grouped[:2])
+        if flush:
+            return HandRank.FLUSH, descending
+        if straight:
+            return HandRank.STRAIGHT, (descending[0],)
+    if top_counts[0] >= 3:
+        return HandRank.THREE_OF_A_KIND, tuple(grouped)
+    if top_counts[0] == 2 and top_counts[1] == 2:
+        return HandRank.TWO_PAIR, tuple(grouped)
+    if top_counts[0] == 2:
+        return HandRank.PAIR, tuple(grouped)
+    return HandRank.HIGH_CARD, descending
+
+
+class HandEvaluator:
+    """Scores hands for one GameConfig as single ints, where a higher score is a better hand.
+
+    Scores are looked up by a key packing the hand's sorted ranks, plus whether it is a flush. The lookup
+    tables fill in as new keys are seen, or all at once with precompute(). score_arrays builds the keys for
+    a whole array of hands with NumPy and only looks up each distinct key once.
+    """
+
+    def __init__(self, config: GameConfig):
+        self.config = config
+        self.max_cards = max(config.max_hand_size, config.initial_hand_size)
+        self._base = config.num_ranks + 1
+        self._scores: dict[int, int] = {}
+        self._flush_scores: dict[int, int] = {}
+
+    def _rank_key(self, descending: Sequence[int]) -> int:
+        key = 0
+        for i in range(self.max_cards):
+            key = key * self._base + (descending[i] if i < len(descending) else 0)
+        return key
+
+    def _ranks_from_key(self, key: int) -> tuple[int, ...]:
+        ranks = []
+        for _ in range(self.max_cards):
+            key, rank = divmod(key, self._base)
+            if rank:
+                ranks.append(rank)
+        return tuple(reversed(ranks))
+
+    def _encode(self, hand_rank: HandRank, tiebreakers: tuple[int, ...]) -> int:
+        return int(hand_rank) * self._base ** self.max_cards + self._rank_key(tiebreakers)
+
+    def _lookup(self, key: int, flush: bool) -> int:
+        table = self._flush_scores if flush else self._scores
+        score = table.get(key)
+        if score is None:
+            score = self._encode(*rank_hand(self._ranks_from_key(key), flush))
+            table[key] = score
+        return score
+
+    def score(self, hand: Hand) -> int:
+        cards = hand.cards
+        if len(cards) > self.max_cards:
+            raise ValueError(f"Hand has {len(cards)} cards, more than the {self.max_cards} this config allows")
+        flush = len(cards) >= 3 and all(c.suit == cards[0].suit for c in cards)
+        return self._lookup(self._rank_key(sorted((c.rank for c in cards), reverse=True)), flush)
+
+    def evaluate(self, hand: Hand) -> tuple[HandRank, tuple[int, ...]]:
+        cards = hand.cards
+        flush = len(cards) >= 3 and all(c.suit == cards[0].suit for c in cards)
+        return rank_hand([c.rank for c in cards], flush)
+
+    def compare(self, a: Hand, b: Hand) -> int:
+        """1 if a beats b, -1 if b beats a and 0 for a tie."""
+        score_a, score_b = self.score(a), self.score(b)
+        return (score_a > score_b) - (score_a < score_b)
+
+    def precompute(self):
+        """Fills the lookup tables for every set of ranks a hand can hold under the config."""
+        for size in range(self.max_cards + 1):
+            for ranks in combinations_with_replacement(range(self.config.num_ranks, 0, -1), size):
+                if any(count > self.config.num_suits for count in Counter(ranks).values()):
+                    continue
+                key = self._rank_key(ranks)
+                self._lookup(key, False)
+                if size >= 3:
+                    self._lookup(key, True)
+
+    def score_arrays(self, ranks: "np.ndarray", suits: "np.ndarray") -> "np.ndarray":
+        """Scores hands given as (hands, max_cards) arrays of ranks and suits, with 0 in empty slots."""
+        import numpy as np
+
+        if self._encode(HandRank.STRAIGHT_FLUSH, (self.config.num_ranks,) * self.max_cards) >= 2 ** 63:
+            raise ValueError("Hand scores for this config don't fit in 64 bits")
+
+        # Same packing as _rank_key: descending ranks with the empty slots last
+        descending = -np.sort(-ranks, axis=1)
+        weights = self._base ** np.arange(self.max_cards - 1, -1, -1, dtype=np.int64)
+        rank_keys = descending @ weights
+
+        present = ranks > 0
+        lowest_suit = np.where(present, suits, np.iinfo(np.int64).max).min(axis=1)
+        highest_suit = np.where(present, suits, 0).max(axis=1)
+        flush = (present.sum(axis=1) >= 3) & (lowest_suit == highest_suit)
+
+        unique_keys, inverse = np.unique(rank_keys * 2 + flush, return_inverse=True)
+        unique_scores = np.fromiter(
+            (self._lookup(int(key) >> 1, bool(key & 1)) for key in unique_keys),
+            dtype=np.int64,
+            count=len(unique_keys),
+        )
+        return unique_scores[inverse.reshape(-1)]
+
+
+_evaluators: dict[tuple, HandEvaluator] = {}
+
+def get_hand_evaluator(config: GameConfig) -> HandEvaluator:
+    """Shared evaluator per config, so its lookup tables are only built once."""
+    key = astuple(config)
+    evaluator = _evaluators.get(key)
+    if evaluator is None:
+        evaluator = HandEvaluator(config)
+        _evaluators[key] = evaluator
+    return evaluator
+
+def get_showdown_winners(state: GameState, config: GameConfig) -> list[str]:
+    """Ids of the remaining players holding the best hand. More than one means a tie."""
+    evaluator = get_hand_evaluator(config)
+    scores = {p.id: evaluator.score(p.hand) for p in state.players if not p.eliminated}
+    if not scores:
+        return []
+    best = max(scores.values())
+    return [player_id for player_id, score in scores.items() if score == best]
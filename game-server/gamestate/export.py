@@ -0,0 +1,301 @@
+"""Columnar export of every turn of self-play games, for offline analysis.
+
+An export is a directory of chunks, each a directory with one .npy file per column, plus a manifest.json
+listing them. Readers memory-map the columns, so a chunk costs nothing until its data is touched.
+Run from the game-server directory, overriding any GameConfig field:
+
+    python -m gamestate.export --out turns --games 100000 --players 3 --processes 8
+
+There is one row per state a game went through. The action columns hold what each seat did from that
+state, and the next row of the same game is the outcome. A game's last row is its final state, with
+no actions.
+"""
+from concurrent.futures import Executor, Future
+from dataclasses import asdict, fields
+from multiprocessing import Pool
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterator
+import argparse
+import json
+import logging
+import os
+import shutil
+
+from gamestate.action_ids import ActionSpace
+from gamestate.batch import shard_seeds
+from gamestate.config import GameConfig
+from gamestate.evaluate import get_hand_evaluator
+from gamestate.game_action import GameAction
+from gamestate.game_state import GameState
+from gamestate.simulate import play_game
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NO_ACTION = -1
+NO_WINNER = -1
+
+# Column name: (dtype, whether it has one value per seat, whether it has one value per hand slot)
+COLUMNS: dict[str, tuple[str, bool, bool]] = {
+    "game": ("int64", False, False),
+    "turn": ("int32", False, False),
+    "num_seats": ("int8", False, False),
+    "deck_size": ("int32", False, False),
+    "winner": ("int8", False, False),
+    "hand_size": ("int8", True, False),
+    "hand_rank": ("int16", True, True),
+    "hand_suit": ("int16", True, True),
+    "discard_size": ("int16", True, False),
+    "discard_top_rank": ("int16", True, False),
+    "discard_top_suit": ("int16", True, False),
+    "wager": ("float32", True, False),
+    "stack": ("float32", True, False),
+    "eliminated": ("bool", True, False),
+    # IDs in ActionSpace(num_seats, config)
+    "action": ("int32", True, False),
+}
+# Computed from other columns for a whole chunk at once when it is written
+DERIVED_COLUMNS: dict[str, str] = {
+    # HandEvaluator score of each seat's hand, 0 for empty seats
+    "hand_score": "int64",
+}
+
+
+def state_row(state: GameState, action: GameAction | None, space: ActionSpace, max_seats: int) -> dict[str, Any]:
+    """One row of the export, as plain lists padded to max_seats seats and space.hand_slots cards."""
+    hand_slots = space.hand_slots
+    actions = dict(action.player_actions) if action is not None else {}
+    row: dict[str, Any] = {"num_seats": len(state.players), "deck_size": len(state.deck.cards)}
+    for name, (_, per_seat, per_card) in COLUMNS.items():
+        if per_seat:
+            row[name] = [[0] * hand_slots for _ in range(max_seats)] if per_card else [0] * max_seats
+    row["action"] = [NO_ACTION] * max_seats
+    for seat, p in enumerate(state.players):
+        row["hand_size"][seat] = len(p.hand.cards)
+        for i, card in enumerate(p.hand.cards[:hand_slots]):
+            row["hand_rank"][seat][i] = card.rank
+            row["hand_suit"][seat][i] = card.suit
+        row["discard_size"][seat] = len(p.discard_pile.cards)
+        if p.discard_pile.cards:
+            row["discard_top_rank"][seat] = p.discard_pile.cards[0].rank
+            row["discard_top_suit"][seat] = p.discard_pile.cards[0].suit
+        row["wager"][seat] = p.wager.amount
+        row["stack"][seat] = p.stack.value
+        row["eliminated"][seat] = p.eliminated
+        if p.id in actions:
+            row["action"][seat] = space.encode(state, actions[p.id])
+    return row
+
+
+class TurnWriter:
+    """Streams turns into an export directory.
+
+    Rows are buffered per game and only become part of a chunk when the game is finished, so that every
+    row can carry the game's winner. A chunk is written once it holds chunk_rows rows; with an executor
+    the writing happens there, so recording turns never waits on the disk.
+    """
+
+    def __init__(self, directory: str, config: GameConfig, max_seats: int, chunk_rows: int = 65536, executor: Executor | None = None):
+        self.directory = Path(directory)
+        self.config = config
+        self.max_seats = max_seats
+        self.chunk_rows = chunk_rows
+        self.hand_slots = ActionSpace(0, config).hand_slots
+        self._evaluator = get_hand_evaluator(config)
+        self._executor = executor
+        self._pending: list[Future] = []
+        self._games: dict[str, list[dict[str, Any]]] = {}
+        self._rows: list[dict[str, Any]] = []
+        self._game_keys: list[str] = []
+        self._seeds: list[int | None] = []
+        self._chunks: list[dict[str, Any]] = []
+        self.directory.mkdir(parents=True, exist_ok=True)
+        manifest = self.directory / "manifest.json"
+        if manifest.exists():
+            self._chunks = json.loads(manifest.read_text())["chunks"]
+        self._next_game = sum(len(c["game_keys"]) for c in self._chunks)
+
+    def record(self, game_key: str, state: GameState, action: GameAction | None):
+        """Adds the state a game is in and the action resolved from it (None for the final state)."""
+        if len(state.players) > self.max_seats:
+            # Rows are fixed width; a table this big doesn't fit the export
+            self._games.pop(game_key, None)
+            return
+        rows = self._games.setdefault(game_key, [])
+        row = state_row(state, action, ActionSpace(len(state.players), self.config), self.max_seats)
+        row["turn"] = len(rows)
+        rows.append(row)
+
+    def finish(self, game_key: str, winner_seat: int | None, final_state: GameState | None = None, seed: int | None = None):
+        """Ends a game, adding final_state as its last row. Games that recorded no turns are dropped.
+
+        seed is what the game was started from, listed in the manifest so the game can be played again.
+        """
+        if game_key not in self._games:
+            return
+        if final_state is not None:
+            self.record(game_key, final_state, None)
+        rows = self._games.pop(game_key, None)
+        if not rows:
+            return
+        game = self._next_game
+        self._next_game += 1
+        for row in rows:
+            row["game"] = game
+            row["winner"] = NO_WINNER if winner_seat is None else winner_seat
+        self._rows.extend(rows)
+        self._game_keys.append(game_key)
+        self._seeds.append(seed)
+        if len(self._rows) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """Writes the finished games buffered so far as a chunk."""
+        if not self._rows:
+            return
+        rows, self._rows = self._rows, []
+        game_keys, self._game_keys = self._game_keys, []
+        seeds, self._seeds = self._seeds, []
+        name = f"chunk-{len(self._chunks):06d}"
+        self._chunks.append({"name": name, "rows": len(rows), "game_keys": game_keys, "seeds": seeds})
+        manifest = self._manifest()
+        if self._executor is None:
+            self._write_chunk(name, rows, manifest)
+        else:
+            self._pending = [f for f in self._pending if not f.done()]
+            self._pending.append(self._executor.submit(self._write_chunk, name, rows, manifest))
+
+    def _manifest(self) -> dict[str, Any]:
+        return {
+            "config": asdict(self.config),
+            "max_seats": self.max_seats,
+            "hand_slots": self.hand_slots,
+            "columns": {**{name: dtype for name, (dtype, _, _) in COLUMNS.items()}, **DERIVED_COLUMNS},
+            "chunks": list(self._chunks),
+        }
+
+    def _write_chunk(self, name: str, rows: list[dict[str, Any]], manifest: dict[str, Any]):
+        import numpy as np
+
+        tmp = self.directory / f".{name}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+        arrays = {column: np.array([row[column] for row in rows], dtype=dtype) for column, (dtype, _, _) in COLUMNS.items()}
+        arrays["hand_score"] = self._hand_scores(arrays["hand_rank"], arrays["hand_suit"], arrays["hand_size"])
+        for column, array in arrays.items():
+            np.save(tmp / f"{column}.npy", array)
+        tmp.rename(self.directory / name)
+        # The manifest only lists complete chunks, so a reader never sees half of one
+        manifest_tmp = self.directory / "manifest.json.tmp"
+        manifest_tmp.write_text(json.dumps(manifest))
+        manifest_tmp.replace(self.directory / "manifest.json")
+        logger.debug("Wrote export chunk", extra={"chunk": name, "rows": len(rows)})
+
+    def _hand_scores(self, ranks: "np.ndarray", suits: "np.ndarray", sizes: "np.ndarray") -> "np.ndarray":
+        import numpy as np
+
+        rows, seats, slots = ranks.shape
+        scores = self._evaluator.score_arrays(
+            ranks.reshape(rows * seats, slots).astype(np.int64), suits.reshape(rows * seats, slots).astype(np.int64),
+        ).reshape(rows, seats)
+        return np.where(sizes > 0, scores, 0)
+
+    def close(self):
+        for game_key in list(self._games):
+            self.finish(game_key, None)
+        self.flush()
+        for future in self._pending:
+            future.result()
+
+
+class TurnReader:
+    """Reads one or more export directories, memory-mapping each column."""
+
+    def __init__(self, *directories: str):
+        self.exports = []
+        for directory in directories:
+            manifest = json.loads((Path(directory) / "manifest.json").read_text())
+            self.exports.append((Path(directory), manifest))
+
+    def __len__(self) -> int:
+        return sum(c["rows"] for _, manifest in self.exports for c in manifest["chunks"])
+
+    def chunks(self, columns: list[str] | None = None) -> Iterator[dict[str, "np.ndarray"]]:
+        import numpy as np
+
+        for directory, manifest in self.exports:
+            for chunk in manifest["chunks"]:
+                yield {
+                    column: np.load(directory / chunk["name"] / f"{column}.npy", mmap_mode="r")
+                    for column in (columns or manifest["columns"])
+                }
+
+    def column(self, name: str) -> "np.ndarray":
+        """A whole column across every chunk, loaded into memory."""
+        import numpy as np
+
+        return np.concatenate([chunk[name] for chunk in self.chunks([name])])
+
+    def game_keys(self) -> list[str]:
+        """Key of every game by its number in the game column, per export directory in order."""
+        return [key for _, manifest in self.exports for c in manifest["chunks"] for key in c["game_keys"]]
+
+    def seeds(self) -> list[int | None]:
+        """Seed of every game, in the same order as game_keys. None where it wasn't recorded."""
+        return [
+            seed
+            for _, manifest in self.exports
+            for c in manifest["chunks"]
+            for seed in c.get("seeds", [None] * len(c["game_keys"]))
+        ]
+
+
+def export_games(directory: str, config: GameConfig, num_players: int, seeds: range, max_turns: int = 1000, chunk_rows: int = 65536):
+    """Plays a game per seed, writing every turn of it to directory."""
+    writer = TurnWriter(directory, config, max_seats=num_players, chunk_rows=chunk_rows)
+    for seed in seeds:
+        key = str(seed)
+        final: list[GameState] = []
+
+        def on_turn(state: GameState, action: GameAction, next_state: GameState):
+            writer.record(key, state, action)
+            final[:] = [next_state]
+
+        result = play_game(config, num_players, seed, max_turns=max_turns, on_turn=on_turn)
+        writer.finish(key, result.winner_seat, final[0] if final else None, seed)
+    writer.close()
+
+def _export_shard(args: tuple[str, GameConfig, int, range, int, int]):
+    export_games(*args)
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="directory to write; each process writes a shard-N directory in it")
+    parser.add_argument("--games", type=int, default=10_000)
+    parser.add_argument("--players", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game; game i uses seed + i")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--max-turns", type=int, default=1000)
+    parser.add_argument("--chunk-rows", type=int, default=65536)
+    defaults = GameConfig()
+    for f in fields(GameConfig):
+        parser.add_argument(f"--{f.name}", type=f.type, default=getattr(defaults, f.name))
+    args = parser.parse_args(argv)
+
+    config = GameConfig(**{f.name: getattr(args, f.name) for f in fields(GameConfig)})
+    seeds = range(args.seed, args.seed + args.games)
+    processes = max(1, min(args.processes or 1, args.games))
+    # One shard, and so one export directory, per process
+    shards = shard_seeds(seeds, -(-args.games // processes))
+    with Pool(processes) as pool:
+        pool.map(_export_shard, [
+            (os.path.join(args.out, f"shard-{i}"), config, args.players, shard, args.max_turns, args.chunk_rows)
+            for i, shard in enumerate(shards)
+        ])
+    reader = TurnReader(*(os.path.join(args.out, f"shard-{i}") for i in range(len(shards))))
+    print(json.dumps({"directories": len(shards), "games": len(reader.game_keys()), "rows": len(reader)}))
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,50 @@
+from bisect import insort
 from dataclasses import dataclass, field
+from typing import Any, Iterator, Sequence
+
+# Most distinct instances of each interned type kept; past that, new values are simply not shared
+MAX_INTERNED = 1 << 16
+
+_interned: dict[type, dict[tuple, Any]] = {}
+
+def _intern(cls: type, values: tuple, *types: type) -> Any:
+    """The instance of cls with the given field values, created on first use with its hash computed once.
+
+    Cards, wagers and stacks take few distinct values, so every state of every game shares one instance
+    of each, and rebuilding a state allocates nothing for the parts of it that didn't change. Pass the
+    types of numeric fields that may come as int or float: 1 == 1.0, but an instance shared by both would
+    print as whichever was constructed last.
+    """
+    instances = _interned.setdefault(cls, {})
+    key = values + types
+    instance = instances.get(key)
+    if instance is None:
+        instance = object.__new__(cls)
+        object.__setattr__(instance, "_hash", hash(values))
+        if len(instances) < MAX_INTERNED:
+            instances[key] = instance
+    return instance
+
+def _cache_hash(cls: type) -> type:
+    """Computes the hash of each instance of a frozen dataclass once. The cache is left out of pickles:
+    string hashes differ between processes."""
+    field_hash = cls.__hash__
+
+    def __hash__(self) -> int:
+        h = self.__dict__.get("_hash")
+        if h is None:
+            h = field_hash(self)
+            object.__setattr__(self, "_hash", h)
+        return h
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        state.pop("_hash", None)
+        return state
+
+    cls.__hash__ = __hash__
+    cls.__getstate__ = __getstate__
+    return cls
 
 @dataclass(eq=True, frozen=True)
 class Card():
@@ -9,21 +55,123 @@ class Card():
     # Not exposed to the user of the class, only for internal use.
     _gone: bool = field(default=False)
 
+    def __new__(cls, suit: int, rank: int, protected: bool = False, _gone: bool = False):
+        return _intern(cls, (suit, rank, protected, _gone))
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __reduce__(self):
+        return (Card, (self.suit, self.rank, self.protected, self._gone))
+
 @dataclass(eq=True, frozen=True)
 class NotProtectableCard:
     suit: int
     rank: int
 
+class Shoe(Sequence[NotProtectableCard]):
+    """The cards left in a deck, top first, as an immutable view of a card order shared by the whole game.
+
+    Dealing from the top only moves a cursor, so it is O(1) per card and never copies the remaining cards.
+    Cards taken from below the top are recorded as skipped positions. Within one game two shoes are equal
+    when the same positions are left; shoes over different orders compare by their cards.
+    """
+    __slots__ = ("order", "cursor", "skipped")
+
+    def __init__(self, order: Sequence[NotProtectableCard], cursor: int = 0, skipped: tuple[int, ...] = ()):
+        self.order = order
+        self.cursor = cursor
+        # Sorted positions after the cursor that have already been taken
+        self.skipped = skipped
+
+    def __len__(self) -> int:
+        return len(self.order) - self.cursor - len(self.skipped)
+
+    def _positions(self) -> Iterator[int]:
+        skipped = set(self.skipped)
+        return (i for i in range(self.cursor, len(self.order)) if i not in skipped)
+
+    def __iter__(self) -> Iterator[NotProtectableCard]:
+        order = self.order
+        return (order[i] for i in self._positions())
+
+    def _position(self, index: int) -> int:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Shoe index out of range")
+        position = self.cursor + index
+        for skipped in self.skipped:
+            if skipped > position:
+                break
+            position += 1
+        return position
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+        return self.order[self._position(index)]
+
+    def _without(self, position: int) -> "Shoe":
+        if position != self.cursor:
+            skipped = list(self.skipped)
+            insort(skipped, position)
+            return Shoe(self.order, self.cursor, tuple(skipped))
+        # Keep the cursor on the first card left, so equal shoes look the same
+        cursor, skipped = self.cursor + 1, self.skipped
+        while skipped and skipped[0] == cursor:
+            cursor, skipped = cursor + 1, skipped[1:]
+        return Shoe(self.order, cursor, skipped)
+
+    def draw(self) -> tuple[NotProtectableCard, "Shoe"]:
+        """Deals the top card."""
+        return self.pop(0)
+
+    def pop(self, index: int) -> tuple[NotProtectableCard, "Shoe"]:
+        position = self._position(index)
+        return self.order[position], self._without(position)
+
+    def remove(self, card: NotProtectableCard) -> "Shoe":
+        """The shoe without one copy of card."""
+        for position in self._positions():
+            if self.order[position] == card:
+                return self._without(position)
+        raise ValueError(f"{card} is not in the deck")
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Shoe) and other.order is self.order:
+            return self.cursor == other.cursor and self.skipped == other.skipped
+        if isinstance(other, (Shoe, tuple, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        # Consistent with both kinds of equality without walking the cards
+        return hash(len(self))
+
+    def __deepcopy__(self, memo) -> "Shoe":
+        return self
+
+    def __repr__(self) -> str:
+        return f"Shoe({len(self)} cards)"
+
 @dataclass(eq=True, frozen=True)
 class Deck():
-    cards: tuple[NotProtectableCard, ...]
+    # Any sequence of cards can be passed in; it is stored as a Shoe
+    cards: Shoe
     protected: bool = False
 
+    def __post_init__(self):
+        if not isinstance(self.cards, Shoe):
+            object.__setattr__(self, "cards", Shoe(tuple(self.cards)))
+
+@_cache_hash
 @dataclass(eq=True, frozen=True)
 class Hand:
     cards: tuple[Card, ...]
     protected: bool = False
 
+@_cache_hash
 @dataclass(eq=True, frozen=True)
 class DiscardPile():
     cards: tuple[Card, ...]
@@ -34,10 +182,29 @@ class Wager():
     amount: float
     protected: bool = False
 
+    def __new__(cls, amount: float, protected: bool = False):
+        return _intern(cls, (amount, protected), type(amount))
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __reduce__(self):
+        return (Wager, (self.amount, self.protected))
+
 @dataclass(eq=True, frozen=True)
 class Stack:
     value: float
 
+    def __new__(cls, value: float):
+        return _intern(cls, (value,), type(value))
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __reduce__(self):
+        return (Stack, (self.value,))
+
+@_cache_hash
 @dataclass(eq=True, frozen=True)
 class Player:
     id: str
@@ -47,6 +214,7 @@ class Player:
     wager: Wager
     eliminated: bool = False
 
+@_cache_hash
 @dataclass(eq=True, frozen=True)
 class GameState:
     players: tuple[Player, ...]
@@ -1,20 +1,23 @@
 import random
 
 from gamestate.config import GameConfig
-from gamestate.game_state import Card, Deck, DiscardPile, GameState, Hand, NotProtectableCard, Player, Stack, Wager
+from gamestate.deck import create_shoe, deal
+from gamestate.game_state import Card, Deck, DiscardPile, GameState, Hand, Player, Stack, Wager
 
 
-def create_initial_state(config: GameConfig) -> GameState:
-    deck = create_initial_deck(config)
+def create_initial_state(config: GameConfig, rng: random.Random | None = None) -> GameState:
+    """A game with no players and a deck shuffled by rng. Everything dealt later comes off the top of it,
+    so the seed of rng and the game's actions are enough to replay the game exactly."""
+    deck = create_initial_deck(config, rng)
     return GameState(
         players=(),
         deck=deck,
     )
 
-def deal_player_into_game(state: GameState, player_id: str, config: GameConfig) -> GameState:
+def deal_player_into_game(state: GameState, player_id: str, config: GameConfig, rng: random.Random | None = None) -> GameState:
     if any(p.id == player_id for p in state.players):
         raise ValueError(f"Player with id {player_id} already in game.")
-    deck, hand_cards = deal_cards(state.deck, config.initial_hand_size)
+    deck, hand_cards = deal_cards(state.deck, config.initial_hand_size, rng)
     new_player = Player(
         id=player_id,
         hand=Hand(cards=hand_cards),
@@ -28,19 +31,13 @@ def deal_player_into_game(state: GameState, player_id: str, config: GameConfig)
         deck=deck,
     )
 
-def deal_cards(deck: Deck, count: int) -> tuple[Deck, tuple[Card, ...]]:
-    if count > len(deck.cards):
-        raise ValueError("Not enough cards in deck to deal the requested hand size.")
-    dealt_cards = random.sample(list(deck.cards), count)
-    remaining_deck = Deck(cards=tuple(card for card in deck.cards if card not in dealt_cards))
-    return remaining_deck, tuple(
+def deal_cards(deck: Deck, count: int, rng: random.Random | None = None) -> tuple[Deck, tuple[Card, ...]]:
+    """Deals off the top of the deck, or uniformly from anywhere in it with an rng."""
+    dealt_cards, remaining = deal(deck.cards, count, rng)
+    return Deck(cards=remaining), tuple(
         Card(suit=card.suit, rank=card.rank)
         for card in dealt_cards
     )
 
-def create_initial_deck(config: GameConfig) -> Deck:
-    return Deck(cards=tuple((
-        NotProtectableCard(suit=suit, rank=rank)
-        for suit in range(1, config.num_suits + 1)
-        for rank in range(1, config.num_ranks + 1)
-    )))
+def create_initial_deck(config: GameConfig, rng: random.Random | None = None) -> Deck:
+    return Deck(cards=create_shoe(config, rng))
@@ -12,25 +12,38 @@ def get_takeables(player: Player, config: GameConfig) -> Iterable[TakeableGameOb
     yield TakeableDiscard(player_id=player.id)
 
 
+def get_own_actions(player: Player, config: GameConfig) -> set[PlayerAction]:
+    """Actions a player can take on their own objects: protecting them and discarding cards."""
+    own_actions: set[PlayerAction] = set()
+    for obj in get_takeables(player, config):
+        own_actions.add(ProtectAction(object_to_protect=obj))
+    for i, _ in enumerate(player.hand.cards):
+        own_actions.add(DiscardAction(card_order=i))
+    return own_actions
+
+
+def get_take_actions(target: Player, config: GameConfig, hand_full: bool) -> set[PlayerAction]:
+    """Actions another player can take on the target's objects. Only wagers can be taken with a full hand."""
+    return {
+        TakeAction(object_to_take=obj)
+        for obj in get_takeables(target, config)
+        if not hand_full or isinstance(obj, TakeableWager)
+    }
+
+
 def get_legal_actions(state: GameState, player_id: str, config: GameConfig) -> set[PlayerAction]:
     player = next(p for p in state.players if p.id == player_id)
     if player.eliminated:
         return set()
     
-    # Protect own objects
-    legal_actions = set()
-    for obj in get_takeables(player, config):
-        legal_actions.add(ProtectAction(object_to_protect=obj))
+    # Protect own objects and discard own cards
+    legal_actions = get_own_actions(player, config)
 
     # Take other players' objects
+    hand_full = len(player.hand.cards) >= config.max_hand_size
     for other_player in state.players:
         if other_player.id == player_id or other_player.eliminated:
             continue
-        for obj in get_takeables(other_player, config):
-            if not isinstance(obj, TakeableWager) and len(player.hand.cards) >= config.max_hand_size:
-                continue
-            legal_actions.add(TakeAction(object_to_take=obj))
-    for i, _ in enumerate(player.hand.cards):
-        legal_actions.add(DiscardAction(card_order=i))
+        legal_actions.update(get_take_actions(other_player, config, hand_full))
 
     return legal_actions
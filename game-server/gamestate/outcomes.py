@@ -0,0 +1,158 @@
+from collections import Counter
+from dataclasses import dataclass, replace
+from fractions import Fraction
+from math import factorial
+from typing import Callable, Iterator
+import random
+
+from gamestate.game_action import GameAction
+from gamestate.game_state import Card, GameState, NotProtectableCard
+from gamestate.perform import sample_result
+
+
+@dataclass(frozen=True)
+class DeckDraws:
+    """The joint distribution of the cards the deck takers of one turn draw, without replacement, in turn order.
+
+    Nothing else in a turn is random, and no other part of the turn depends on which cards are drawn, so
+    this is the only factor of the outcome distribution with more than one value. It is kept as counts
+    and only expanded when iterated.
+    """
+    takers: tuple[str, ...]
+    # Copies of each card left in the deck, in first-seen order
+    counts: tuple[tuple[NotProtectableCard, int], ...]
+    total: int
+
+    def __iter__(self) -> Iterator[tuple[tuple[NotProtectableCard, ...], Fraction]]:
+        """Every distinct sequence of drawn cards (one per taker) with its probability."""
+        remaining = dict(self.counts)
+
+        def draw(i: int, left: int, drawn: list[NotProtectableCard], p: Fraction):
+            if i == len(self.takers):
+                yield tuple(drawn), p
+                return
+            for card, count in remaining.items():
+                if count == 0:
+                    continue
+                remaining[card] = count - 1
+                drawn.append(card)
+                yield from draw(i + 1, left - 1, drawn, p * Fraction(count, left))
+                drawn.pop()
+                remaining[card] = count
+
+        yield from draw(0, self.total, [], Fraction(1))
+
+    def __len__(self) -> int:
+        """Number of distinct draw sequences, counted without listing them."""
+        k = len(self.takers)
+        # k! times the x^k coefficient of the product over cards of sum_{j <= copies} x^j / j!
+        poly = [Fraction(1)] + [Fraction(0)] * k
+        for _, count in self.counts:
+            terms = [Fraction(1, factorial(j)) for j in range(min(count, k) + 1)]
+            poly = [sum(poly[d - j] * t for j, t in enumerate(terms) if j <= d) for d in range(k + 1)]
+        return int(poly[k] * factorial(k))
+
+    def probability(self, drawn: tuple[NotProtectableCard, ...]) -> Fraction:
+        remaining = dict(self.counts)
+        p = Fraction(1)
+        for i, card in enumerate(drawn):
+            count = remaining.get(card, 0)
+            if count == 0:
+                return Fraction(0)
+            p *= Fraction(count, self.total - i)
+            remaining[card] = count - 1
+        return p
+
+    def marginal(self) -> dict[NotProtectableCard, Fraction]:
+        """Chance of each card for any one taker; by symmetry it is the same for all of them."""
+        return {card: Fraction(count, self.total) for card, count in self.counts}
+
+    def sample(self, rng: random.Random) -> tuple[NotProtectableCard, ...]:
+        pool = [card for card, count in self.counts for _ in range(count)]
+        return tuple(rng.sample(pool, len(self.takers)))
+
+
+class OutcomeDistribution:
+    """Every distinct state a turn can lead to, with its exact probability.
+
+    The turn is resolved once with the deck draws left open, and the draws are kept as a separate
+    DeckDraws factor. Outcomes are only built when iterated, so the size of the distribution, the chance
+    of a state or the marginals of the draws never need the full cross product.
+    """
+
+    def __init__(self, state: GameState, base: GameState, draws: DeckDraws | None):
+        self._state = state
+        # The resolved turn, with whatever cards the takers happened to draw off the top
+        self.base = base
+        self.draws = draws
+
+    def _with_draws(self, drawn: tuple[NotProtectableCard, ...]) -> GameState:
+        deck = self._state.deck.cards
+        for card in drawn:
+            deck = deck.remove(card)
+        new_cards = dict(zip(self.draws.takers, drawn))
+        return replace(
+            self.base,
+            deck=replace(self.base.deck, cards=deck),
+            players=tuple(
+                replace(p, hand=replace(p.hand, cards=p.hand.cards[:-1] + (Card(suit=new_cards[p.id].suit, rank=new_cards[p.id].rank),)))
+                if p.id in new_cards else p
+                for p in self.base.players
+            ),
+        )
+
+    def __iter__(self) -> Iterator[tuple[GameState, Fraction]]:
+        if self.draws is None:
+            yield self.base, Fraction(1)
+            return
+        for drawn, p in self.draws:
+            yield self._with_draws(drawn), p
+
+    def __len__(self) -> int:
+        return 1 if self.draws is None else len(self.draws)
+
+    def drawn_cards(self, state: GameState) -> tuple[NotProtectableCard, ...]:
+        """The cards the takers drew to reach state. Each taker's drawn card is the last in their hand."""
+        hands = {p.id: p.hand.cards for p in state.players}
+        return tuple(
+            NotProtectableCard(suit=hands[taker][-1].suit, rank=hands[taker][-1].rank)
+            for taker in self.draws.takers
+        )
+
+    def probability(self, state: GameState) -> Fraction:
+        if self.draws is None:
+            return Fraction(state == self.base)
+        drawn = self.drawn_cards(state)
+        p = self.draws.probability(drawn)
+        if p == 0 or self._with_draws(drawn) != state:
+            return Fraction(0)
+        return p
+
+    def expectation(self, value: Callable[[GameState], float]) -> float:
+        return sum(p * value(state) for state, p in self)
+
+    def sample(self, rng: random.Random) -> GameState:
+        return self.base if self.draws is None else self._with_draws(self.draws.sample(rng))
+
+    def to_dict(self) -> dict[GameState, Fraction]:
+        return dict(self)
+
+
+def get_outcome_distribution(state: GameState, action: GameAction) -> OutcomeDistribution:
+    """Exact distribution of the states resolving action can lead to, from the point of view of someone
+    who doesn't know the order of the deck: every card left in it is equally likely to be drawn next."""
+    base = sample_result(state, action)
+    deck_protected = any(
+        player_action.type == "protect" and player_action.object_to_protect.type == "deck"
+        for _, player_action in action.player_actions
+    )
+    eliminated = {p.id for p in state.players if p.eliminated}
+    takers = tuple(
+        player_id
+        for player_id, player_action in action.player_actions
+        if player_action.type == "take" and player_action.object_to_take.type == "deck" and player_id not in eliminated
+    )
+    if deck_protected or not takers:
+        return OutcomeDistribution(state, base, None)
+    counts = Counter(state.deck.cards)
+    return OutcomeDistribution(state, base, DeckDraws(takers, tuple(counts.items()), len(state.deck.cards)))
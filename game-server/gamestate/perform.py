@@ -1,15 +1,59 @@
 from dataclasses import replace
+from typing import Literal
+from gamestate import compact
 from gamestate.game_action import GameAction, ProtectAction, TakeAction, DiscardAction
-from gamestate.game_state import Card, GameState
+from gamestate.game_state import Card, GameState, Hand, NotProtectableCard, Player, Shoe
+import logging
 import random
 
-def perform_random_action(state: GameState, action: GameAction) -> GameState:
-    possible_results = get_possible_results(state, action)
-    return random.choice(list(possible_results))
+logger = logging.getLogger(__name__)
+
+PHASES = ("protect", "take", "discard")
+
+# How turns are resolved: on the game_state dataclasses, or converted to gamestate.compact and back
+Backend = Literal["dataclass", "compact"]
+
+def perform_random_action(state: GameState, action: GameAction, rng: random.Random | None = None, backend: Backend = "dataclass") -> GameState:
+    if backend == "compact":
+        return compact.from_compact(compact.sample_result(compact.to_compact(state), action, rng))
+    return sample_result(state, action, rng)
+
+def sample_result(state: GameState, action: GameAction, rng: random.Random | None = None) -> GameState:
+    """Returns one next game state, drawn with the probabilities of gamestate.outcomes.get_outcome_distribution.
+
+    Taking from the deck is the only step with more than one outcome, so drawing each card as the takes
+    are resolved is equivalent to enumerating every outcome first. It is not the same as picking uniformly
+    from get_possible_results when the deck holds several copies of a card.
+
+    Without an rng the cards come off the top of the already shuffled deck, so the result depends only on
+    the state and the action. With one they are drawn uniformly from the whole deck.
+    """
+    for phase in PHASES:
+        for (player_id, player_action) in action.player_actions:
+            if player_action.type != phase:
+                continue
+            if phase == "take":
+                state = sample_take(state, player_id, player_action, rng)
+            elif phase == "protect":
+                (state,) = perform_protect(state, player_id, player_action)
+            else:
+                (state,) = perform_discard(state, player_id, player_action)
+    return clear_temporary_flags(state)
+
+def sample_take(state: GameState, player_id: str, action: TakeAction, rng: random.Random | None) -> GameState:
+    if action.object_to_take.type == "deck" and not state.deck.protected and not find_player(state, player_id).eliminated:
+        if len(state.deck.cards) == 0:
+            raise ValueError("Cannot take from an empty deck")
+        if rng is None:
+            card, remaining = state.deck.cards.draw()
+            return take_from_deck(state, player_id, card, remaining)
+        return take_from_deck(state, player_id, rng.choice(state.deck.cards))
+    (result,) = perform_take(state, player_id, action)
+    return result
 
 def get_possible_results(state: GameState, action: GameAction) -> set[GameState]:
     """Returns a set of all possible next game states after performing the given action on the given state."""
-    print(action)
+    logger.debug("Enumerating possible results", extra={"action": action})
     current_possible_gamestates = {state}
     # Perform protect actions first
     for (player_id, player_action) in action.player_actions:
@@ -40,18 +84,29 @@ def get_possible_results(state: GameState, action: GameAction) -> set[GameState]
     return {clear_temporary_flags(s) for s in current_possible_gamestates}
 
 def clear_temporary_flags(state: GameState) -> GameState:
+    """Unprotects everything and drops the cards taken or discarded during the turn.
+
+    The flags are what marks an object dirty: only flagged objects and the ones holding them are rebuilt,
+    the rest is shared with state, and state itself is returned if nothing was flagged.
+    """
+    players = tuple(clear_player_flags(p) for p in state.players)
+    if not state.deck.protected and all(new is old for new, old in zip(players, state.players)):
+        return state
     return replace(state,
-        deck=replace(state.deck, protected=False),
-        players=tuple(
-            replace(p,
-                hand=replace(p.hand, protected=False, cards=tuple(replace(c, protected=False) for c in p.hand.cards if not c._gone)),
-                discard_pile=replace(p.discard_pile, protected=False),
-                wager=replace(p.wager, protected=False)
-            )
-            for p in state.players
-        )
+        deck=replace(state.deck, protected=False) if state.deck.protected else state.deck,
+        players=players,
     )
 
+def clear_player_flags(p: Player) -> Player:
+    hand = p.hand
+    if hand.protected or any(c.protected or c._gone for c in hand.cards):
+        hand = Hand(cards=tuple(replace(c, protected=False) if c.protected else c for c in hand.cards if not c._gone))
+    discard_pile = replace(p.discard_pile, protected=False) if p.discard_pile.protected else p.discard_pile
+    wager = replace(p.wager, protected=False) if p.wager.protected else p.wager
+    if hand is p.hand and discard_pile is p.discard_pile and wager is p.wager:
+        return p
+    return replace(p, hand=hand, discard_pile=discard_pile, wager=wager)
+
 def perform_protect(state: GameState, player_id: str, action: ProtectAction) -> set[GameState]:
 
     if action.object_to_protect.type == "deck":
@@ -135,23 +190,16 @@ def perform_take(state: GameState, player_id: str, action: TakeAction) -> set[Ga
             return {eliminate_player(state, player_id)}
         if len(state.deck.cards) == 0:
             raise ValueError("Cannot take from an empty deck")
-        result = set()
-        for card in state.deck.cards:
-            next_state = replace(state, 
-                deck=replace(state.deck, cards=tuple(c for c in state.deck.cards if c != card)),
-                players=tuple(
-                    replace(p,
-                        hand=replace(p.hand,
-                                    cards
-                                     =  p.hand.cards
-                                     + (Card(suit=card.suit, rank=card.rank),)) 
-                    ) 
-                    if p.id == player_id else p
-                    for p in state.players
-                )
-            )
-            result.add(next_state)
-        return result
+        results = set()
+        seen = set()
+        for i, card in enumerate(state.deck.cards):
+            # Copies of a card from other decks lead to the same state as the first one
+            if card in seen:
+                continue
+            seen.add(card)
+            _, remaining = state.deck.cards.pop(i)
+            results.add(take_from_deck(state, player_id, card, remaining))
+        return results
     elif action.object_to_take.type == "card":
         target_player = find_player(state, action.object_to_take.player_id)
         if target_player.hand.protected or target_player.hand.cards[action.object_to_take.card_order].protected:
@@ -240,6 +288,22 @@ def perform_take(state: GameState, player_id: str, action: TakeAction) -> set[Ga
     else:
         raise ValueError(f"Unknown object to take type: {action.object_to_take.type}")
 
+def take_from_deck(state: GameState, player_id: str, card: NotProtectableCard, remaining: Shoe | None = None) -> GameState:
+    """Moves card from the deck to the player's hand. remaining is the deck without it, if already known."""
+    return replace(state, 
+        deck=replace(state.deck, cards=state.deck.cards.remove(card) if remaining is None else remaining),
+        players=tuple(
+            replace(p,
+                hand=replace(p.hand,
+                            cards
+                             =  p.hand.cards
+                             + (Card(suit=card.suit, rank=card.rank),)) 
+            ) 
+            if p.id == player_id else p
+            for p in state.players
+        )
+    )
+
 def perform_discard(state: GameState, player_id: str, action: DiscardAction) -> set[GameState]:
     player = find_player(state, player_id)
     if (player.eliminated):
@@ -0,0 +1,117 @@
+from dataclasses import dataclass, field
+from typing import Callable, Literal
+import random
+import time
+
+from gamestate.config import GameConfig
+from gamestate.evaluate import is_terminal_state
+from gamestate.game_action import GameAction, PlayerAction
+from gamestate.game_state import GameState
+from gamestate.initial_state import create_initial_state, deal_player_into_game
+from gamestate.neighbors import get_legal_actions
+from gamestate.perform import Backend, perform_random_action
+
+# Chooses an action for a player. Policies must only draw randomness from the given rng so games are reproducible.
+Policy = Callable[[GameState, str, GameConfig, random.Random], PlayerAction]
+
+# Called after every resolved turn with the state before, the joint action and the state after
+TurnHook = Callable[[GameState, GameAction, GameState], None]
+
+EndReason = Literal["last_player_standing", "stalled", "max_turns"]
+
+
+def playable_actions(state: GameState, player_id: str, config: GameConfig) -> list[PlayerAction]:
+    """Legal actions minus those that can't be resolved on their own (taking from an empty deck or discard pile).
+
+    Sorted so that choosing from the list with a seeded rng doesn't depend on set iteration order.
+    """
+    players = {p.id: p for p in state.players}
+    actions = []
+    for action in get_legal_actions(state, player_id, config):
+        if action.type == "take":
+            obj = action.object_to_take
+            if obj.type == "deck" and len(state.deck.cards) == 0:
+                continue
+            if obj.type == "discard" and len(players[obj.player_id].discard_pile.cards) == 0:
+                continue
+        actions.append(action)
+    return sorted(actions, key=repr)
+
+def random_policy(state: GameState, player_id: str, config: GameConfig, rng: random.Random) -> PlayerAction:
+    return rng.choice(playable_actions(state, player_id, config))
+
+
+@dataclass
+class GameResult:
+    seed: int
+    player_ids: tuple[str, ...]
+    turns: int
+    end_reason: EndReason
+    winner: str | None
+    # (player_id, type of the protected object they tried to take), in elimination order
+    eliminations: list[tuple[str, str]] = field(default_factory=list)
+    # Wall time spent resolving each turn, in nanoseconds
+    turn_latencies_ns: list[int] = field(default_factory=list)
+
+    @property
+    def winner_seat(self) -> int | None:
+        return None if self.winner is None else self.player_ids.index(self.winner)
+
+
+def start_game(config: GameConfig, player_ids: tuple[str, ...], rng: random.Random) -> GameState:
+    state = create_initial_state(config, rng)
+    for player_id in player_ids:
+        state = deal_player_into_game(state, player_id, config)
+    return state
+
+def play_game(
+    config: GameConfig,
+    num_players: int,
+    seed: int,
+    policies: dict[str, Policy] | None = None,
+    max_turns: int = 1000,
+    on_turn: TurnHook | None = None,
+    backend: Backend = "dataclass",
+) -> GameResult:
+    """Plays one game to the end. Players without an entry in policies play randomly."""
+    rng = random.Random(seed)
+    player_ids = tuple(f"p{i}" for i in range(num_players))
+    policies = policies or {}
+    state = start_game(config, player_ids, rng)
+    result = GameResult(seed=seed, player_ids=player_ids, turns=0, end_reason="max_turns", winner=None)
+
+    while result.turns < max_turns:
+        if is_terminal_state(state):
+            result.end_reason = "last_player_standing"
+            break
+        action = GameAction(player_actions=tuple(
+            (p.id, policies.get(p.id, random_policy)(state, p.id, config, rng))
+            for p in state.players
+            if not p.eliminated
+        ))
+        start = time.perf_counter_ns()
+        try:
+            # Cards come off the top of the deck start_game shuffled with rng
+            next_state = perform_random_action(state, action, backend=backend)
+        except ValueError:
+            # e.g. more players drew from the deck than it had cards left
+            result.end_reason = "stalled"
+            break
+        result.turn_latencies_ns.append(time.perf_counter_ns() - start)
+        result.turns += 1
+        record_eliminations(state, action, next_state, result.eliminations)
+        if on_turn is not None:
+            on_turn(state, action, next_state)
+        state = next_state
+
+    survivors = [p.id for p in state.players if not p.eliminated]
+    if len(survivors) == 1:
+        result.winner = survivors[0]
+    return result
+
+def record_eliminations(state: GameState, action: GameAction, next_state: GameState, eliminations: list[tuple[str, str]]):
+    was_eliminated = {p.id for p in state.players if p.eliminated}
+    newly_eliminated = {p.id for p in next_state.players if p.eliminated and p.id not in was_eliminated}
+    for (player_id, player_action) in action.player_actions:
+        if player_id in newly_eliminated and player_action.type == "take":
+            eliminations.append((player_id, player_action.object_to_take.type))
@@ -0,0 +1,327 @@
+"""Multi-table tournaments of self-play, run as a batch without the server.
+
+Every player starts with initial_stack chips at one of many tables. Tables play turns in rounds, all of them
+at once (across a process pool if given one), and between rounds the scheduler:
+  - records the players eliminated in the round in the standings,
+  - breaks up tables while there are more than the survivors need, and moves players from the fullest
+    tables to the shortest until they differ by at most one,
+  - raises the blind every level_rounds rounds.
+Run from the game-server directory, overriding any GameConfig field:
+
+    python -m gamestate.tournament --players 5000 --table-size 6 --processes 8 --standings standings.jsonl
+
+A table whose players change, or whose deck runs out, starts a new hand: a freshly shuffled deck and new
+hands for everyone, who keep their chips (stack plus wager). Cards in hands and discard piles don't carry over.
+"""
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import asdict, dataclass, fields, replace
+from typing import IO, Any, Iterator
+import argparse
+import json
+import math
+import random
+
+from gamestate.config import GameConfig
+from gamestate.evaluate import is_terminal_state
+from gamestate.game_action import GameAction
+from gamestate.game_state import GameState
+from gamestate.initial_state import create_initial_state, deal_player_into_game
+from gamestate.perform import perform_random_action
+from gamestate.simulate import random_policy
+
+
+def post_blinds(state: GameState, blind: float) -> GameState:
+    """Tops every player's wager up to the blind from their stack, as far as their stack goes."""
+    return replace(state, players=tuple(
+        replace(
+            p,
+            stack=replace(p.stack, value=p.stack.value - (top_up := min(p.stack.value, max(0.0, blind - p.wager.amount)))),
+            wager=replace(p.wager, amount=p.wager.amount + top_up),
+        )
+        for p in state.players
+    ))
+
+def new_hand(config: GameConfig, seats: list[tuple[str, float]], blind: float, rng: random.Random) -> GameState:
+    """A table of the given (player_id, chips) with a freshly shuffled deck, each player's blind posted."""
+    state = create_initial_state(config, rng)
+    for player_id, _ in seats:
+        state = deal_player_into_game(state, player_id, config)
+    stacks = dict(seats)
+    state = replace(state, players=tuple(
+        replace(p, stack=replace(p.stack, value=stacks[p.id]), wager=replace(p.wager, amount=0.0))
+        for p in state.players
+    ))
+    return post_blinds(state, blind)
+
+def play_turns(config: GameConfig, state: GameState, turns: int, seed: int) -> tuple[GameState, bool]:
+    """Plays up to turns turns at one table with random policies. Also returns whether the table needs a
+    new hand because its deck ran out."""
+    rng = random.Random(seed)
+    for _ in range(turns):
+        if is_terminal_state(state):
+            break
+        if len(state.deck.cards) == 0:
+            return state, True
+        action = GameAction(player_actions=tuple(
+            (p.id, random_policy(state, p.id, config, rng)) for p in state.players if not p.eliminated
+        ))
+        try:
+            state = perform_random_action(state, action)
+        except ValueError:
+            # More players drew from the deck than it had cards left
+            return state, True
+    return state, False
+
+def _play_tables(args: tuple[GameConfig, list[tuple[GameState, int]], int]) -> list[tuple[GameState, bool]]:
+    config, tables, turns = args
+    return [play_turns(config, state, turns, seed) for state, seed in tables]
+
+
+@dataclass
+class Table:
+    id: int
+    state: GameState
+
+    def alive(self) -> list[str]:
+        return [p.id for p in self.state.players if not p.eliminated]
+
+    def seats(self) -> list[tuple[str, float]]:
+        return [(p.id, p.stack.value + p.wager.amount) for p in self.state.players if not p.eliminated]
+
+
+class Tournament:
+    """Runs a tournament, keeping tables bucketed by how many players are alive at them.
+
+    Finding the shortest and fullest tables looks at one bucket per table size, and every move touches two
+    tables, so a round of scheduling costs O(table_size) per player moved, however many players there are.
+    Standings are appended to a JSON lines file as players are eliminated.
+    """
+
+    def __init__(
+        self,
+        config: GameConfig,
+        num_players: int,
+        table_size: int = 6,
+        seed: int = 0,
+        turns_per_round: int = 5,
+        level_rounds: int = 10,
+        blind_growth: float = 1.5,
+        standings: IO[str] | None = None,
+        executor: Executor | None = None,
+        chunk_size: int = 64,
+    ):
+        if table_size * config.initial_hand_size > config.num_suits * config.num_ranks * config.num_decks:
+            raise ValueError("Not enough cards in deck to deal a full table.")
+        self.config = config
+        self.table_size = table_size
+        self.turns_per_round = turns_per_round
+        self.level_rounds = level_rounds
+        self.blind_growth = blind_growth
+        self.standings = standings
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.rng = random.Random(seed)
+        self.round = 0
+        self.level = 0
+        self.remaining = num_players
+        self.places: list[tuple[int, str]] = []
+        self.tables: dict[int, Table] = {}
+        # Players alive at a table -> ids of tables with that many (a dict as an insertion-ordered set)
+        self._by_alive: dict[int, dict[int, None]] = {}
+        self._alive: dict[int, int] = {}
+        self._next_table = 0
+
+        player_ids = [f"p{i}" for i in range(num_players)]
+        num_tables = max(1, math.ceil(num_players / table_size))
+        for i in range(num_tables):
+            seats = [(player_id, config.initial_stack) for player_id in player_ids[i::num_tables]]
+            self._add_table(new_hand(config, seats, self.blind, self.rng))
+
+    @property
+    def blind(self) -> float:
+        return self.config.blind * self.blind_growth ** self.level
+
+    @property
+    def finished(self) -> bool:
+        return self.remaining <= 1
+
+    def _add_table(self, state: GameState) -> Table:
+        table = Table(self._next_table, state)
+        self._next_table += 1
+        self.tables[table.id] = table
+        self._index(table)
+        return table
+
+    def _index(self, table: Table):
+        self._set_alive(table.id, len(table.alive()))
+
+    def _set_alive(self, table_id: int, alive: int):
+        self._unindex(table_id)
+        self._alive[table_id] = alive
+        self._by_alive.setdefault(alive, {})[table_id] = None
+
+    def _unindex(self, table_id: int):
+        alive = self._alive.pop(table_id, None)
+        if alive is None:
+            return
+        bucket = self._by_alive[alive]
+        del bucket[table_id]
+        if not bucket:
+            del self._by_alive[alive]
+
+    def _shortest(self, exclude: int | None = None) -> int | None:
+        for alive in range(0, self.table_size + 1):
+            for table_id in self._by_alive.get(alive, ()):
+                if table_id != exclude:
+                    return table_id
+        return None
+
+    def _fullest(self) -> int | None:
+        for alive in range(self.table_size, -1, -1):
+            for table_id in self._by_alive.get(alive, ()):
+                return table_id
+        return None
+
+    def play_round(self):
+        """Advances every table with at least two players by turns_per_round turns, then reschedules."""
+        self.round += 1
+        active = [table for table in self.tables.values() if self._alive[table.id] > 1]
+        jobs = [(table.state, self.rng.getrandbits(64)) for table in active]
+        chunks = [jobs[i:i + self.chunk_size] for i in range(0, len(jobs), self.chunk_size)]
+        args = [(self.config, chunk, self.turns_per_round) for chunk in chunks]
+        results = (self.executor.map(_play_tables, args) if self.executor is not None else map(_play_tables, args))
+        played = [result for chunk in results for result in chunk]
+
+        # (chips, player_id, table_id) of everyone knocked out this round
+        eliminated: list[tuple[float, str, int]] = []
+        for table, (state, _) in zip(active, played):
+            before = table.alive()
+            table.state = state
+            alive = set(table.alive())
+            chips = {p.id: p.stack.value + p.wager.amount for p in state.players}
+            eliminated.extend((chips[player_id], player_id, table.id) for player_id in before if player_id not in alive)
+        eliminated.sort()
+        if eliminated and len(eliminated) == self.remaining:
+            # Everyone left went out in the same round; the one with the most chips stays in and wins
+            _, survivor, table_id = eliminated.pop()
+            table = self.tables[table_id]
+            table.state = replace(table.state, players=tuple(
+                replace(p, eliminated=False) if p.id == survivor else p for p in table.state.players
+            ))
+        # Players knocked out together are placed by their chips, the fewest placing last
+        for _, player_id, table_id in eliminated:
+            self._eliminate(player_id, table_id)
+
+        needs_new_hand: dict[int, list[tuple[str, float]]] = {}
+        for table, (_, out_of_cards) in zip(active, played):
+            self._index(table)
+            if out_of_cards:
+                needs_new_hand[table.id] = table.seats()
+
+        if self.level_rounds and self.round % self.level_rounds == 0:
+            self.level += 1
+            for table in self.tables.values():
+                if table.id not in needs_new_hand:
+                    table.state = post_blinds(table.state, self.blind)
+        self._rebalance(needs_new_hand)
+        if self.finished:
+            for table in self.tables.values():
+                for player_id in table.alive():
+                    self._place(1, player_id, table.id)
+        if self.standings is not None:
+            self.standings.flush()
+
+    def _eliminate(self, player_id: str, table_id: int):
+        self._place(self.remaining, player_id, table_id)
+        self.remaining -= 1
+
+    def _place(self, place: int, player_id: str, table_id: int):
+        self.places.append((place, player_id))
+        if self.standings is not None:
+            self.standings.write(json.dumps({
+                "place": place, "player_id": player_id, "table": table_id, "round": self.round, "level": self.level,
+            }) + "\n")
+
+    def _rebalance(self, changed: dict[int, list[tuple[str, float]]]):
+        """Moves players between tables (as lists of seats in changed), then deals every changed table a new hand."""
+
+        def seats(table_id: int) -> list[tuple[str, float]]:
+            if table_id not in changed:
+                changed[table_id] = self.tables[table_id].seats()
+            return changed[table_id]
+
+        def move(source: int, target: int):
+            seats(target).append(seats(source).pop())
+            self._set_alive(source, len(changed[source]))
+            self._set_alive(target, len(changed[target]))
+
+        # Break up the shortest tables while the survivors fit at fewer
+        while len(self.tables) > max(1, math.ceil(self.remaining / self.table_size)):
+            source = self._shortest()
+            for _ in range(self._alive[source]):
+                move(source, self._shortest(exclude=source))
+            self._unindex(source)
+            del self.tables[source]
+            changed.pop(source, None)
+        # Even out what's left
+        while (fullest := self._fullest()) is not None and self._alive[fullest] - self._alive[self._shortest()] > 1:
+            move(fullest, self._shortest())
+
+        for table_id, table_seats in changed.items():
+            table = self.tables[table_id]
+            table.state = new_hand(self.config, table_seats, self.blind, self.rng)
+            self._index(table)
+
+    def run(self, max_rounds: int = 100_000) -> Iterator["Tournament"]:
+        """Plays rounds until one player is left, yielding after each."""
+        while not self.finished and self.round < max_rounds:
+            self.play_round()
+            yield self
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "rounds": self.round,
+            "level": self.level,
+            "blind": self.blind,
+            "remaining": self.remaining,
+            "tables": len(self.tables),
+            "winner": next((player_id for place, player_id in self.places if place == 1), None),
+        }
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--table-size", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--turns-per-round", type=int, default=5)
+    parser.add_argument("--level-rounds", type=int, default=10, help="rounds per blind level")
+    parser.add_argument("--blind-growth", type=float, default=1.5, help="factor the blind grows by each level")
+    parser.add_argument("--max-rounds", type=int, default=100_000)
+    parser.add_argument("--processes", type=int, default=1, help="processes to play tables on; 1 plays them here")
+    parser.add_argument("--standings", help="JSON lines file to append standings to as players are eliminated")
+    defaults = GameConfig()
+    for f in fields(GameConfig):
+        parser.add_argument(f"--{f.name}", type=f.type, default=getattr(defaults, f.name))
+    args = parser.parse_args(argv)
+
+    config = GameConfig(**{f.name: getattr(args, f.name) for f in fields(GameConfig)})
+    standings = open(args.standings, "a") if args.standings else None
+    executor = ProcessPoolExecutor(args.processes) if args.processes > 1 else None
+    try:
+        tournament = Tournament(
+            config, args.players, args.table_size, args.seed,
+            turns_per_round=args.turns_per_round, level_rounds=args.level_rounds, blind_growth=args.blind_growth,
+            standings=standings, executor=executor,
+        )
+        for _ in tournament.run(args.max_rounds):
+            pass
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if standings is not None:
+            standings.close()
+    print(json.dumps({"config": asdict(config), "players": args.players, **tournament.summary()}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,127 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from dataclasses import dataclass, replace, asdict
-from typing import Literal
-from fastapi import FastAPI
+from typing import Any, Literal
+from pydantic import TypeAdapter, ValidationError
+from fastapi import FastAPI, Header, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, Response
 from sse_starlette.sse import EventSourceResponse
-import json
 import asyncio
+import httpx
+import json
+import logging
+import os
+import random
+import time
 import uuid
 import yaml
-from collections import defaultdict
 
 from gamestate.config import GameConfig
 from gamestate.game_action import GameAction, PlayerAction
 from gamestate.game_state import GameState
-from gamestate.neighbors import get_legal_actions
-from gamestate.perform import perform_random_action
+from gamestate.action_ids import ActionSpace
+from gamestate.action_index import LegalActionIndex
+from gamestate.bots import MCTSBot
+from gamestate.evaluate import is_terminal_state
+from gamestate.export import TurnWriter
 from gamestate.initial_state import create_initial_state, deal_player_into_game
+from gamestate.metrics import REGISTRY
+from server.actors import GameActor, GameBusy, GameClosed, create_executor, resolve_turn
+from server.broker import create_broker
+from server.hub import EventHub, Subscriber
+from server.lobby import Lobby, Matchmaker, config_variant, open_seats
+from server.peers import Peers
+from server.logs import configure_logging
+from server.profiling import ProfilerMiddleware, profiler_options
+from server.scheduler import EvictionTracker, TimerWheel, default_action
+from server.sharding import ClusterConfig
+from server.snapshots import GameSnapshot
+from server.sockets import PlayerSocket
+from server.store import open_store
 
 config = yaml.safe_load(open("config.yaml"))
 game_config = GameConfig(**config["game"])
+events_config = config.get("events", {})
+bots_config = config.get("bots", {})
+actors_config = config.get("actors", {})
+storage_config = config.get("storage", {})
+scheduler_config = config.get("scheduler", {})
+export_config = config.get("export", {})
+lobby_config = config.get("lobby", {})
+websocket_config = config.get("websocket", {})
+
+log_listener = configure_logging(os.environ.get("LOG_LEVEL") or config.get("logging", {}).get("level", "INFO"))
+logger = logging.getLogger("server")
 
-app = FastAPI()
+# Set by server.cluster when running as one of several workers
+cluster = ClusterConfig.from_env()
+cluster_ring = cluster.ring() if cluster.enabled else None
+peers = Peers(cluster)
+if cluster.enabled and "path" in storage_config:
+    # Every worker keeps the log of its own games
+    storage_config = {**storage_config, "path": f"{storage_config['path']}.{cluster.worker_index}"}
+if cluster.enabled and export_config.get("path"):
+    export_config = {**export_config, "path": f"{export_config['path']}.{cluster.worker_index}"}
+
+store = open_store(storage_config)
+resolve_executor = create_executor(actors_config.get("executor", "thread"), actors_config.get("workers"))
+resolve_backend = actors_config.get("backend", "dataclass")
+# Bots keep their search tree in memory, so they always think on threads of this process
+bot_executor = ThreadPoolExecutor(max_workers=actors_config.get("bot_workers"), thread_name_prefix="bot")
+# One thread, so chunks are written in order and never hold up the event loop
+export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+turn_writer = TurnWriter(
+    export_config["path"],
+    game_config,
+    max_seats=export_config.get("max_seats", 8),
+    chunk_rows=export_config.get("chunk_rows", 65536),
+    executor=export_executor,
+) if export_config.get("path") else None
+
+turn_timeout: float | None = scheduler_config.get("turn_timeout", 60)
+turn_deadlines = TimerWheel(time.monotonic(), tick=scheduler_config.get("tick", 0.1))
+evictions = EvictionTracker(
+    idle_ttl=scheduler_config.get("idle_ttl", 3600),
+    finished_ttl=scheduler_config.get("finished_ttl", 300),
+    max_games=scheduler_config.get("max_games"),
+)
+
+# Quick-join only seats players at games of this server's configuration
+game_variant = config_variant(game_config)
+table_size: int = lobby_config.get("table_size", 4)
+lobby = Lobby(table_size)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if event_hub.broker is not None:
+        await event_hub.broker.start(event_hub.deliver)
+    scheduler_task = asyncio.create_task(run_scheduler())
+    yield
+    scheduler_task.cancel()
+    for task in list(bot_tasks.values()):
+        task.cancel()
+    matchmaker.stop()
+    if event_hub.broker is not None:
+        await event_hub.broker.close()
+    await peers.close()
+    for actor in game_id_to_actor.values():
+        actor.stop()
+    resolve_executor.shutdown(cancel_futures=True)
+    bot_executor.shutdown(cancel_futures=True)
+    if turn_writer is not None:
+        turn_writer.close()
+    export_executor.shutdown()
+    store.close()
+    log_listener.stop()
+
+app = FastAPI(lifespan=lifespan)
 game_id_to_state: dict[str, GameState] = {}
 game_id_to_pending_action: dict[str, GameAction] = {}
+game_id_to_action_index: dict[str, LegalActionIndex] = {}
+game_id_to_snapshot: dict[str, GameSnapshot] = {}
+game_id_to_bots: dict[str, dict[str, MCTSBot]] = {}
+game_id_to_actor: dict[str, GameActor] = {}
 
 origins = [
     "*"
@@ -36,27 +135,52 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+if (profiler := profiler_options()) is not None:
+    app.add_middleware(ProfilerMiddleware, **profiler)
+
 @dataclass
 class ActionPerformedEvent:
     game_id: str 
     action: GameAction
+    version: int
+    delta: dict[str, Any]
     type: Literal["actions_performed"] = "actions_performed"
 
 @dataclass
 class PlayerJoinedEvent:
     game_id: str 
     player_id: str
+    version: int
+    delta: dict[str, Any]
     type: Literal["player_joined"] = "player_joined"
 
 Event = ActionPerformedEvent | PlayerJoinedEvent
 
-player_id_to_event_queue: dict[str, asyncio.Queue[Event]] = defaultdict(asyncio.Queue[Event])
+@dataclass
+class ActionIdRequest:
+    """An action given by its ID in the game's ActionSpace instead of spelled out."""
+    action_id: int
+
+# Events are published already encoded so each one is serialized once, not once per player
+event_hub = EventHub(
+    max_buffer=events_config.get("max_buffer", 64),
+    overflow=events_config.get("overflow", "drop_oldest"),
+    broker=create_broker(cluster.broker_address),
+    replay_size=events_config.get("replay_size", 32),
+    max_replay_games=events_config.get("max_replay_games", 10_000),
+)
 
-async def event_generator(player_id: str):
-    queue = player_id_to_event_queue[player_id]
-    while True:
-        data = await queue.get()
-        yield f"{json.dumps(asdict(data))}\n\n"
+async def event_generator(subscriber: Subscriber):
+    try:
+        while (data := await subscriber.get()) is not None:
+            # The ID says where the stream is in each of the player's games, so a reconnecting EventSource
+            # sends it back as Last-Event-ID and only gets what it missed
+            yield {"data": data, "id": subscriber.cursor()}
+    finally:
+        event_hub.unsubscribe(subscriber)
+
+def snapshot_response(snapshot: GameSnapshot) -> Response:
+    return Response(content=snapshot.state_json(), media_type="application/json")
 
 @app.post("/api/v1/players")
 def create_player():
@@ -65,63 +189,350 @@ def create_player():
 
 @app.post("/api/v1/players/{player_id}/games/create")
 def create_game(player_id: str):
-    game_id = str(uuid.uuid4())[:4]
-    game_state = create_initial_state(game_config)
+    return snapshot_response(game_id_to_snapshot[start_game(player_id)])
+
+def start_game(player_id: str) -> str:
+    game_id = new_game_id()
+    # The game's own RNG stream; its seed is all it takes to replay the game from its actions
+    seed = store.new_seed()
+    game_state = create_initial_state(game_config, random.Random(seed))
     game_state = deal_player_into_game(game_state, player_id, game_config)
+    store.record_created(game_id, player_id, seed)
+    register_game(game_id, game_state, seed=seed)
+    event_hub.add_player(game_id, player_id)
+    evictions.touch(game_id, time.monotonic())
+    return game_id
+
+def new_game_id() -> str:
+    """An unused game id that hashes to this worker, so the router sends the game's requests here."""
+    while True:
+        game_id = str(uuid.uuid4())[:4]
+        if game_id not in game_id_to_state and cluster.owns(game_id, cluster_ring):
+            return game_id
+
+def register_game(game_id: str, game_state: GameState, version: int = 0, seed: int | None = None):
     game_id_to_state[game_id] = game_state
-    return JSONResponse(content={"game_id": game_id, "state": asdict(game_state)})
+    game_id_to_action_index[game_id] = LegalActionIndex(game_state, game_config)
+    game_id_to_snapshot[game_id] = GameSnapshot(game_id, game_state, game_config, version, seed)
+    game_id_to_actor[game_id] = GameActor(game_id, max_queue=actors_config.get("max_queue", 256))
+    on_new_version(game_id)
+
+def on_new_version(game_id: str):
+    """Starts the clock on the game's current turn, or notes that the game is over."""
+    state = game_id_to_state[game_id]
+    lobby.update(game_id, game_variant, open_seats(state, game_config, table_size))
+    if is_terminal_state(state):
+        turn_deadlines.cancel(game_id)
+        # A game with one player is waiting for others to join, not finished
+        if len(state.players) > 1:
+            evictions.mark_finished(game_id, time.monotonic())
+            if turn_writer is not None:
+                survivors = [seat for seat, p in enumerate(state.players) if not p.eliminated]
+                turn_writer.finish(game_id, survivors[0] if len(survivors) == 1 else None, state, game_id_to_snapshot[game_id].seed)
+        return
+    if turn_timeout is not None:
+        version = game_id_to_snapshot[game_id].version
+        turn_deadlines.schedule(game_id, turn_timeout, lambda: asyncio.create_task(expire_turn(game_id, version)))
+
+def busy_response() -> JSONResponse:
+    return JSONResponse(content={"error": "Game is busy, try again"}, status_code=503)
+
+def not_found_response() -> JSONResponse:
+    return JSONResponse(content={"error": "Game not found"}, status_code=404)
 
 @app.post("/api/v1/players/{player_id}/games/{game_id}/join")
 async def join_game(player_id: str, game_id: str):
-    game_state = game_id_to_state.get(game_id)
-    if game_state is None:
+    actor = game_id_to_actor.get(game_id)
+    if actor is None:
         return JSONResponse(content={"error": "Game not found"}, status_code=404)
     try:
-        new_state = deal_player_into_game(game_state, player_id, game_config)
-        game_id_to_state[game_id] = new_state
-        for player in new_state.players:
-            if player.id != player_id:
-                asyncio.create_task(player_id_to_event_queue[player.id].put(
-                    PlayerJoinedEvent(game_id=game_id, player_id=player_id)
-                ))
-        return JSONResponse(content={"game_id": game_id, "state": asdict(new_state)})
+        snapshot = await actor.call(join_command, game_id, player_id)
+        return snapshot_response(snapshot)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    except GameBusy:
+        return busy_response()
+    except GameClosed:
+        return not_found_response()
+
+async def join_command(game_id: str, player_id: str) -> GameSnapshot:
+    snapshot = add_player(game_id, player_id)
+    evictions.touch(game_id, time.monotonic())
+    schedule_bot_turns(game_id)
+    return snapshot
+
+@app.get("/api/v1/lobby")
+async def get_lobby(variant: str | None = None, limit: int = 50, local: bool = False):
+    """Open games, fullest first. In a cluster this asks every worker, unless local."""
+    limit = min(limit, 1000)
+    games = [
+        {"game_id": game_id, "variant": v, "players": len(game_id_to_state[game_id].players), "open_seats": seats}
+        for game_id, v, seats in lobby.open_games(variant, limit)
+    ]
+    if not local and peers.others():
+        params = {"local": "true", "limit": limit, **({"variant": variant} if variant is not None else {})}
+        for response in await asyncio.gather(
+            *(peers.request(worker, "GET", "/api/v1/lobby", params=params) for worker in peers.others()),
+            return_exceptions=True,
+        ):
+            if isinstance(response, httpx.Response) and response.is_success:
+                games.extend(response.json()["games"])
+        games = sorted(games, key=lambda game: game["open_seats"])[:limit]
+    return JSONResponse(content={"games": games})
+
+@app.post("/api/v1/players/{player_id}/lobby/quick-join")
+async def quick_join(player_id: str, local: bool = False):
+    """Seats the player at the fullest open game, or at a new table with whoever else arrives shortly.
+
+    In a cluster, open games on this worker come first, then those of the other workers, which are asked
+    in turn with local set: seat the player at one of your own games, or answer 404 instead of waiting.
+    Players who find no open game anywhere wait for a table with the others arriving at this worker.
+    """
+    game_id = lobby.reserve(game_variant, exclude=event_hub.games_of(player_id))
+    try:
+        if game_id is None:
+            if local:
+                return JSONResponse(content={"error": "No open game"}, status_code=404)
+            if (response := await quick_join_elsewhere(player_id)) is not None:
+                return response
+            snapshot = await matchmaker.wait_for_table(player_id)
+        else:
+            try:
+                snapshot = await game_id_to_actor[game_id].call(join_command, game_id, player_id)
+            finally:
+                lobby.release(game_id)
+        return snapshot_response(snapshot)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    except GameBusy:
+        return busy_response()
+    except GameClosed:
+        return not_found_response()
+
+async def quick_join_elsewhere(player_id: str) -> Response | None:
+    """The response of the first other worker that seated the player at one of its open games."""
+    for worker in peers.others():
+        try:
+            response = await peers.request(worker, "POST", f"/api/v1/players/{player_id}/lobby/quick-join", params={"local": "true"})
+        except httpx.HTTPError:
+            logger.warning("Quick-join on another worker failed", extra={"worker": worker}, exc_info=True)
+            continue
+        if response.status_code != 404:
+            return Response(content=response.content, status_code=response.status_code, media_type="application/json")
+    return None
+
+async def start_table(player_ids: list[str]) -> GameSnapshot:
+    host, *guests = player_ids
+    game_id = start_game(host)
+    for guest in guests:
+        await game_id_to_actor[game_id].call(join_command, game_id, guest)
+    return game_id_to_snapshot[game_id]
+
+matchmaker = Matchmaker(table_size, lobby_config.get("batch_window", 0.5), start_table)
+
+@app.post("/api/v1/games/{game_id}/bots")
+async def add_bot(game_id: str):
+    actor = game_id_to_actor.get(game_id)
+    if actor is None:
+        return JSONResponse(content={"error": "Game not found"}, status_code=404)
+    bot_id = str(uuid.uuid4())[:4]
+    try:
+        await actor.call(add_bot_command, game_id, bot_id)
     except ValueError as e:
         return JSONResponse(content={"error": str(e)}, status_code=400)
+    except GameBusy:
+        return busy_response()
+    except GameClosed:
+        return not_found_response()
+    return JSONResponse(content={"game_id": game_id, "player_id": bot_id})
+
+async def add_bot_command(game_id: str, bot_id: str):
+    add_player(game_id, bot_id, bot=True)
+    add_bot_player(game_id, bot_id)
+    evictions.touch(game_id, time.monotonic())
+    schedule_bot_turns(game_id)
+
+def add_bot_player(game_id: str, bot_id: str):
+    game_id_to_bots.setdefault(game_id, {})[bot_id] = MCTSBot(
+        game_config,
+        time_budget=bots_config.get("time_budget", 0.25),
+        table_size=bots_config.get("table_size", 4096),
+    )
+
+def add_player(game_id: str, player_id: str, bot: bool = False) -> GameSnapshot:
+    new_state = deal_player_into_game(game_id_to_state[game_id], player_id, game_config)
+    game_id_to_state[game_id] = new_state
+    game_id_to_action_index[game_id].update(new_state)
+    snapshot = game_id_to_snapshot[game_id]
+    delta = snapshot.update(new_state)
+    store.record_joined(game_id, snapshot.version, player_id, bot)
+    event = json.dumps(asdict(PlayerJoinedEvent(game_id=game_id, player_id=player_id, version=snapshot.version, delta=delta)))
+    event_hub.publish(game_id, snapshot.version, event, exclude=player_id)
+    event_hub.add_player(game_id, player_id)
+    on_new_version(game_id)
+    return snapshot
 
 @app.get("/api/v1/players/{player_id}/events")
-async def get_events(player_id: str):
-    return EventSourceResponse(event_generator(player_id))
+async def get_events(player_id: str, last_event_id: str | None = Header(default=None)):
+    return EventSourceResponse(event_generator(event_hub.subscribe(player_id, last_event_id)))
 
 @app.get("/api/v1/players/{player_id}/games/{game_id}/actions")
 def get_actions(player_id: str, game_id: str):
     state = game_id_to_state.get(game_id)
     if state is None:
         return JSONResponse(content={"error": "Game not found"}, status_code=404)
-    if all(player.id != player_id for player in state.players):
+    if not event_hub.in_game(game_id, player_id):
+        return JSONResponse(content={"error": "Player not in game"}, status_code=400)
+    snapshot = game_id_to_snapshot[game_id]
+    return Response(
+        content=snapshot.actions_json(player_id, game_id_to_action_index[game_id].legal_actions(player_id)),
+        media_type="application/json",
+        # The version the actions are legal in, for sockets relaying them from another worker
+        headers={"X-Game-Version": str(snapshot.version)},
+    )
+
+@app.get("/api/v1/players/{player_id}/games/{game_id}/action_ids")
+def get_action_ids(player_id: str, game_id: str):
+    state = game_id_to_state.get(game_id)
+    if state is None:
+        return JSONResponse(content={"error": "Game not found"}, status_code=404)
+    if not event_hub.in_game(game_id, player_id):
         return JSONResponse(content={"error": "Player not in game"}, status_code=400)
-    return JSONResponse(content=list(asdict(x) for x in get_legal_actions(state, player_id, game_config)))
+    space = ActionSpace(len(state.players), game_config)
+    return JSONResponse(content={
+        "version": game_id_to_snapshot[game_id].version,
+        "action_ids": sorted(space.encode(state, a) for a in game_id_to_action_index[game_id].legal_actions(player_id)),
+    })
 
 @app.get("/api/v1/games/{game_id}")
 def get_game_state(game_id: str):
-    game_state = game_id_to_state.get(game_id)
-    if game_state is None:
+    snapshot = game_id_to_snapshot.get(game_id)
+    if snapshot is None:
         return JSONResponse(content={"error": "Game not found"}, status_code=404)
-    return JSONResponse(content={
-        "game_id": game_id,
-        "state": asdict(game_state)
-    })
+    return snapshot_response(snapshot)
 
 
 @app.post("/api/v1/players/{player_id}/games/{game_id}/actions")
-async def perform_action(player_id: str, game_id: str, action: PlayerAction):
-    
-    game_state = game_id_to_state.get(game_id)
-    if game_state is None:
-        return JSONResponse(content={"error": "Game not found"}, status_code=404)
+async def perform_action(player_id: str, game_id: str, action: PlayerAction | ActionIdRequest):
+    error = await try_action(game_id, player_id, action)
+    if error is not None:
+        status_code, message = error
+        return JSONResponse(content={"error": message}, status_code=status_code)
+
+async def try_action(game_id: str, player_id: str, action: PlayerAction | ActionIdRequest) -> tuple[int, str] | None:
+    """Submits the player's action. Returns the status code and message of the error, if there was one."""
+    actor = game_id_to_actor.get(game_id)
+    if actor is None:
+        return 404, "Game not found"
+    try:
+        legal = await actor.call(action_command, game_id, player_id, action)
+    except GameBusy:
+        return 503, "Game is busy, try again"
+    except GameClosed:
+        return 404, "Game not found"
+    if not legal:
+        return 400, "Illegal action"
+    return None
+
+player_action_adapter = TypeAdapter(PlayerAction)
+
+@app.websocket("/api/v1/players/{player_id}/ws")
+async def player_socket(websocket: WebSocket, player_id: str, last_event_id: str | None = None):
+    await websocket.accept()
+    subscriber = event_hub.subscribe(player_id, last_event_id)
+
+    async def submit(game_id: str, message: dict[str, Any]) -> str | None:
+        try:
+            if "action_id" in message:
+                action = ActionIdRequest(action_id=int(message["action_id"]))
+            else:
+                action = player_action_adapter.validate_python(message.get("action"))
+        except (ValidationError, TypeError, ValueError):
+            return "Malformed action"
+        if (owner := peers.owner(game_id)) is not None:
+            return await forward_action(owner, game_id, player_id, action)
+        error = await try_action(game_id, player_id, action)
+        return None if error is None else error[1]
+
+    try:
+        socket = PlayerSocket(
+            websocket,
+            subscriber,
+            submit,
+            lambda game_id, with_state: game_messages(player_id, game_id, with_state),
+            tick=websocket_config.get("tick", 0.01),
+        )
+        # A resumed session gets what it missed instead
+        await socket.run([] if last_event_id is not None else list(event_hub.games_of(player_id)))
+    finally:
+        event_hub.unsubscribe(subscriber)
+
+async def forward_action(worker: str, game_id: str, player_id: str, action: PlayerAction | ActionIdRequest) -> str | None:
+    """Submits a socket's action for a game another worker owns, through its HTTP API. Returns the error, if any."""
+    try:
+        response = await peers.request(worker, "POST", f"/api/v1/players/{player_id}/games/{game_id}/actions", json=asdict(action))
+    except httpx.HTTPError:
+        logger.warning("Forwarding action failed", extra={"game_id": game_id, "worker": worker}, exc_info=True)
+        return "Game is unavailable, try again"
+    if response.is_success:
+        return None
+    return response.json().get("error", "Illegal action")
+
+async def game_messages(player_id: str, game_id: str, with_state: bool) -> list[str]:
+    """The state (if asked for) and the player's legal actions of a game, encoded for a socket frame."""
+    if (owner := peers.owner(game_id)) is not None:
+        return await remote_game_messages(owner, player_id, game_id, with_state)
+    snapshot = game_id_to_snapshot.get(game_id)
+    if snapshot is None or not event_hub.in_game(game_id, player_id):
+        return []
+    messages = []
+    if with_state:
+        messages.append(state_message(snapshot.state_json()))
+    actions = snapshot.actions_json(player_id, game_id_to_action_index[game_id].legal_actions(player_id))
+    messages.append(actions_message(game_id, snapshot.version, actions))
+    return messages
+
+async def remote_game_messages(worker: str, player_id: str, game_id: str, with_state: bool) -> list[str]:
+    """game_messages for a game another worker owns, from its HTTP API."""
+    try:
+        actions = await peers.request(worker, "GET", f"/api/v1/players/{player_id}/games/{game_id}/actions")
+        if not actions.is_success:
+            # Not found, or the player isn't in it
+            return []
+        messages = []
+        if with_state:
+            state = await peers.request(worker, "GET", f"/api/v1/games/{game_id}")
+            if state.is_success:
+                messages.append(state_message(state.content))
+    except httpx.HTTPError:
+        logger.warning("Fetching game from its worker failed", extra={"game_id": game_id, "worker": worker}, exc_info=True)
+        return []
+    messages.append(actions_message(game_id, int(actions.headers["X-Game-Version"]), actions.content))
+    return messages
 
-    if action not in get_legal_actions(game_state, player_id, game_config):
-        return JSONResponse(content={"error": "Illegal action"}, status_code=400)
+def state_message(state_json: bytes) -> str:
+    # The state body is {"game_id", "version", "state"}; tag it without decoding it
+    return '{"type": "state", ' + state_json.decode()[1:]
 
+def actions_message(game_id: str, version: int, actions_json: bytes) -> str:
+    return f'{{"type": "actions", "game_id": {json.dumps(game_id)}, "version": {version}, "actions": {actions_json.decode()}}}'
+
+async def action_command(game_id: str, player_id: str, action: PlayerAction | ActionIdRequest) -> bool:
+    # Checked here rather than in the handler so the state can't change between the check and the submission
+    if isinstance(action, ActionIdRequest):
+        state = game_id_to_state[game_id]
+        try:
+            action = ActionSpace(len(state.players), game_config).decode(state, action.action_id)
+        except ValueError:
+            return False
+    if not game_id_to_action_index[game_id].is_legal(player_id, action):
+        return False
+    evictions.touch(game_id, time.monotonic())
+    await submit_action(game_id, player_id, action)
+    return True
+
+async def submit_action(game_id: str, player_id: str, action: PlayerAction):
+    game_state = game_id_to_state[game_id]
     game_id_to_pending_action[game_id] = replace(
         game_id_to_pending_action.get(game_id, GameAction(player_actions=())),
         player_actions=game_id_to_pending_action.get(game_id, GameAction(player_actions=())).player_actions + ((player_id, action),)
@@ -129,15 +540,217 @@ async def perform_action(player_id: str, game_id: str, action: PlayerAction):
 
     if frozenset(player_id for player_id, action in game_id_to_pending_action[game_id].player_actions) == frozenset(player.id for player in game_state.players if not player.eliminated):
         # All players have acted, process the actions
-        new_state = perform_random_action(game_state, game_id_to_pending_action[game_id])
+        new_state, seconds = await asyncio.get_running_loop().run_in_executor(
+            resolve_executor, resolve_turn, game_state, game_id_to_pending_action[game_id], resolve_backend
+        )
+        turn_resolve_seconds.observe(seconds)
         game_id_to_state[game_id] = new_state
         game_action = game_id_to_pending_action.pop(game_id)
+        game_id_to_action_index[game_id].update(new_state, game_action)
+        snapshot = game_id_to_snapshot[game_id]
+        delta = snapshot.update(new_state)
+        store.record_turn(game_id, snapshot.version, game_action, new_state)
+        if turn_writer is not None:
+            turn_writer.record(game_id, game_state, game_action)
+        turns_resolved.inc()
 
         # Notify all players of the new state
-        for player in new_state.players:
-            asyncio.create_task(player_id_to_event_queue[player.id].put(
-                ActionPerformedEvent(action=game_action, game_id=game_id)
-            ))
+        event = json.dumps(asdict(ActionPerformedEvent(action=game_action, game_id=game_id, version=snapshot.version, delta=delta)))
+        event_hub.publish(game_id, snapshot.version, event)
+        on_new_version(game_id)
+        schedule_bot_turns(game_id)
+
+# The task running each game's bots, and the games that reached a new version while theirs was running
+bot_tasks: dict[str, asyncio.Task] = {}
+bot_reruns: set[str] = set()
+
+def schedule_bot_turns(game_id: str):
+    """Starts the game's bots on its current version. They think outside the game's actor, so the command
+    that got the game there (e.g. a human's action) is answered without waiting for them.
+
+    A bot's search tree isn't thread safe, so a game never has two searches running: if its bots are still
+    thinking, they start again on the latest version once they are done.
+    """
+    if game_id in bot_tasks:
+        bot_reruns.add(game_id)
+        return
+    bot_tasks[game_id] = asyncio.create_task(run_bot_turns(game_id))
+
+async def run_bot_turns(game_id: str):
+    try:
+        while True:
+            bot_reruns.discard(game_id)
+            await play_bot_turns(game_id)
+            if game_id not in bot_reruns:
+                return
+    finally:
+        bot_tasks.pop(game_id, None)
+
+async def play_bot_turns(game_id: str):
+    """Has every bot in the game that hasn't acted this turn yet choose an action, then submits them."""
+    # Runs again after earlier runs awaited, by which time the game may have been evicted
+    bots = game_id_to_bots.get(game_id)
+    state = game_id_to_state.get(game_id)
+    snapshot = game_id_to_snapshot.get(game_id)
+    if not bots or state is None or snapshot is None:
+        return
+    # Bots only play alongside humans, so a table of bots can't keep resolving turns on its own
+    if is_terminal_state(state) or all(p.eliminated or p.id in bots for p in state.players):
+        return
+    version = snapshot.version
+    pending = game_id_to_pending_action.get(game_id, GameAction(player_actions=()))
+    acted = {player_id for player_id, _ in pending.player_actions}
+    bot_ids = [p.id for p in state.players if p.id in bots and not p.eliminated and p.id not in acted]
+    loop = asyncio.get_running_loop()
+    actions = await asyncio.gather(*(
+        loop.run_in_executor(bot_executor, bots[bot_id].choose_action, state, bot_id)
+        for bot_id in bot_ids
+    ))
+    actor = game_id_to_actor.get(game_id)
+    if actor is None:
+        return
+    try:
+        await actor.call(bot_actions_command, game_id, version, list(zip(bot_ids, actions)))
+    except GameBusy:
+        # The turn deadline acts for them instead
+        logger.debug("Bot actions dropped, game is busy", extra={"game_id": game_id})
+    except GameClosed:
+        # Evicted while they were thinking
+        pass
+
+async def bot_actions_command(game_id: str, version: int, actions: list[tuple[str, PlayerAction]]):
+    """Submits the bots' actions, if the game is still at the version they were chosen for."""
+    snapshot = game_id_to_snapshot.get(game_id)
+    if snapshot is None or snapshot.version != version:
+        # Moved on (or was evicted) while they were thinking; the new version started them again
+        return
+    for bot_id, action in actions:
+        pending = game_id_to_pending_action.get(game_id, GameAction(player_actions=()))
+        if any(player_id == bot_id for player_id, _ in pending.player_actions):
+            continue
+        await submit_action(game_id, bot_id, action)
+        if snapshot.version != version:
+            # The bot's action completed the turn
+            return
+
+async def expire_turn(game_id: str, version: int):
+    actor = game_id_to_actor.get(game_id)
+    if actor is None:
+        return
+    try:
+        await actor.call(deadline_command, game_id, version)
+    except GameBusy:
+        # Plenty is happening in the game already; check on it again next turn_timeout,
+        # unless it was evicted while the command waited
+        if game_id in game_id_to_state:
+            on_new_version(game_id)
+    except GameClosed:
+        # Evicted before the deadline's turn came
+        pass
+
+async def deadline_command(game_id: str, version: int):
+    """Submits a default action for every player who hasn't acted by the turn deadline."""
+    snapshot = game_id_to_snapshot.get(game_id)
+    if snapshot is None or snapshot.version != version:
+        return
+    turn_deadlines_missed.inc()
+    state = game_id_to_state[game_id]
+    pending = game_id_to_pending_action.get(game_id, GameAction(player_actions=()))
+    acted = {player_id for player_id, _ in pending.player_actions}
+    index = game_id_to_action_index[game_id]
+    for player in state.players:
+        if player.eliminated or player.id in acted:
+            continue
+        await submit_action(game_id, player.id, default_action(player.id, index.legal_actions(player.id)))
+        if game_id_to_state[game_id] is not state:
+            return
+
+async def evict_command(game_id: str):
+    # Whatever is queued behind this command finds the game gone
+    game_id_to_actor[game_id].close()
+    turn_deadlines.cancel(game_id)
+    bot_task = bot_tasks.pop(game_id, None)
+    if bot_task is not None:
+        bot_task.cancel()
+    bot_reruns.discard(game_id)
+    seed = game_id_to_snapshot[game_id].seed
+    for mapping in (game_id_to_state, game_id_to_pending_action, game_id_to_action_index, game_id_to_snapshot, game_id_to_bots):
+        mapping.pop(game_id, None)
+    event_hub.remove_game(game_id)
+    lobby.remove(game_id)
+    store.record_evicted(game_id)
+    if turn_writer is not None:
+        # Evicted before it finished: keep its turns, without a winner
+        turn_writer.finish(game_id, None, seed=seed)
+
+async def evict_game(game_id: str):
+    actor = game_id_to_actor.get(game_id)
+    if actor is None:
+        return
+    try:
+        # Through the actor, so the game isn't removed halfway through one of its commands
+        await actor.call(evict_command, game_id)
+    except GameBusy:
+        # Try again on the next sweep
+        evictions.touch(game_id, time.monotonic())
+        return
+    except GameClosed:
+        # Evicted by a call that got there first
+        return
+    game_id_to_actor.pop(game_id, None)
+    actor.stop()
+
+async def run_scheduler():
+    """Fires turn deadlines every tick and evicts games every sweep_interval."""
+    sweep_interval = scheduler_config.get("sweep_interval", 5)
+    next_sweep = time.monotonic() + sweep_interval
+    while True:
+        await asyncio.sleep(turn_deadlines.tick)
+        now = time.monotonic()
+        for callback in turn_deadlines.advance(now):
+            callback()
+        if now >= next_sweep:
+            next_sweep = now + sweep_interval
+            for game_id, reason in evictions.collect(now):
+                logger.info("Evicting game", extra={"game_id": game_id, "reason": reason})
+                asyncio.create_task(evict_game(game_id))
+
+turns_resolved = REGISTRY.counter("game_turns_resolved_total", "Turns resolved")
+turn_resolve_seconds = REGISTRY.histogram("game_turn_resolve_seconds", "Time the rules engine took to resolve a turn")
+turn_deadlines_missed = REGISTRY.counter("game_turn_deadlines_missed_total", "Turns resolved with default actions for late players")
+REGISTRY.gauge("game_live_games", "Games in memory", lambda: [({}, len(game_id_to_state))])
+REGISTRY.gauge("game_live_players", "Players not yet eliminated in games in memory", lambda: [
+    ({}, sum(not p.eliminated for state in game_id_to_state.values() for p in state.players)),
+])
+REGISTRY.gauge("game_evictions_total", "Games evicted from memory", lambda: [
+    ({"reason": reason}, count) for reason, count in evictions.evictions.items()
+], type="counter")
+REGISTRY.gauge("game_actor_queue_depth", "Commands queued across all game actors", lambda: [
+    ({}, sum(actor.depth() for actor in game_id_to_actor.values())),
+])
+REGISTRY.gauge("lobby_open_games", "Games with open seats", lambda: [({}, len(lobby))])
+REGISTRY.gauge("lobby_waiting_players", "Quick-join players waiting for a new table", lambda: [({}, matchmaker.waiting())])
+REGISTRY.gauge("broker_dropped_events_total", "Events dropped because the event relay fell behind", lambda: [
+    ({}, event_hub.broker.dropped if event_hub.broker is not None else 0),
+], type="counter")
+REGISTRY.gauge("sse_subscribers", "Open event streams", lambda: [({}, event_hub.subscriber_count())])
+REGISTRY.gauge("sse_queue_depth", "Events buffered across open event streams, in total and for the fullest one", lambda: [
+    ({"stat": "total"}, sum(depths := event_hub.queue_depths())),
+    ({"stat": "max"}, max(depths, default=0)),
+])
+
+@app.get("/metrics")
+def metrics():
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# Bring back the games the store kept from before the last restart
+for restored in store.restore(game_config):
+    register_game(restored.game_id, restored.state, restored.version, restored.seed)
+    for player in restored.state.players:
+        event_hub.add_player(restored.game_id, player.id)
+    for bot_id in restored.bot_ids:
+        add_bot_player(restored.game_id, bot_id)
+    evictions.touch(restored.game_id, time.monotonic())
 
 @app.get("/")
 async def root():
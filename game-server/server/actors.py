@@ -0,0 +1,99 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable
+import asyncio
+import time
+
+from gamestate.game_action import GameAction
+from gamestate.game_state import GameState
+from gamestate.perform import Backend, perform_random_action
+
+
+class GameBusy(Exception):
+    """The game's command queue is full."""
+
+
+class GameClosed(Exception):
+    """The game was evicted, so its commands no longer run."""
+
+
+def resolve_turn(state: GameState, action: GameAction, backend: Backend = "dataclass") -> tuple[GameState, float]:
+    """Module level so it can run in a process pool. Cards are drawn off the top of the game's shuffled deck.
+
+    Also returns the seconds it took, for the server to record: metrics recorded in a pool process would be lost.
+    """
+    start = time.perf_counter()
+    new_state = perform_random_action(state, action, backend=backend)
+    return new_state, time.perf_counter() - start
+
+
+class GameActor:
+    """Runs every command for one game, one at a time, on a single task.
+
+    Commands are coroutine functions. Since they never overlap, a command can await (e.g. to resolve a turn
+    in an executor) without another request seeing or changing the game halfway through.
+    """
+
+    def __init__(self, game_id: str, max_queue: int = 256):
+        self.game_id = game_id
+        self._queue: asyncio.Queue[tuple[Callable[..., Awaitable[Any]], tuple, asyncio.Future]] = asyncio.Queue(maxsize=max_queue)
+        self._task: asyncio.Task | None = None
+        self.closed = False
+
+    async def call(self, command: Callable[..., Awaitable[Any]], *args) -> Any:
+        if self.closed:
+            raise GameClosed(f"Game {self.game_id} is closed")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f"game-{self.game_id}")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((command, args, future))
+        except asyncio.QueueFull:
+            raise GameBusy(f"Game {self.game_id} has too many pending commands")
+        return await future
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    async def _run(self):
+        while True:
+            command, args, future = await self._queue.get()
+            if future.done():
+                # The caller went away before the command ran
+                continue
+            if self.closed:
+                future.set_exception(GameClosed(f"Game {self.game_id} is closed"))
+                continue
+            try:
+                result = await command(*args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+    def close(self):
+        """Called by the command that removes the game: every command queued behind it, and every later
+        call, fails with GameClosed instead of running against a game that is gone."""
+        self.closed = True
+
+    def stop(self):
+        self.close()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        # Nothing will run what's still queued, so don't leave its callers waiting
+        while not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(GameClosed(f"Game {self.game_id} is closed"))
+
+
+def create_executor(kind: str, workers: int | None) -> Executor:
+    """Executor for turn resolution. A process pool keeps resolution off the GIL entirely."""
+    if kind == "process":
+        return ProcessPoolExecutor(max_workers=workers)
+    elif kind == "thread":
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="resolve")
+    else:
+        raise ValueError(f"Unknown executor kind: {kind}")
@@ -0,0 +1,156 @@
+from abc import ABC, abstractmethod
+from typing import Callable
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Delivers an encoded event of a game, with its sequence number in the game, to the local event streams
+# of the given players
+Deliver = Callable[[str, int, list[str], str], None]
+
+
+class Broker(ABC):
+    """Carries events between workers. Every worker publishes the events of the games it owns, and every
+    worker delivers each event to the event streams its players have open on it."""
+
+    # Events dropped because they couldn't be passed on fast enough
+    dropped = 0
+
+    @abstractmethod
+    def publish(self, game_id: str, seq: int, player_ids: list[str], data: str):
+        ...
+
+    @abstractmethod
+    async def start(self, deliver: Deliver):
+        ...
+
+    async def close(self):
+        pass
+
+
+class LocalBroker(Broker):
+    """Broker for workers (or event hubs) living in the same process."""
+
+    def __init__(self):
+        self._delivers: list[Deliver] = []
+
+    def publish(self, game_id: str, seq: int, player_ids: list[str], data: str):
+        for deliver in self._delivers:
+            deliver(game_id, seq, player_ids, data)
+
+    async def start(self, deliver: Deliver):
+        self._delivers.append(deliver)
+
+
+class SocketBroker(Broker):
+    """Broker client for a relay started with serve_relay, over a local TCP socket.
+
+    Messages are newline-delimited JSON. The relay echoes every message to every connected worker,
+    including the one that sent it. Published events wait in a queue for the socket to drain; if the relay
+    falls more than max_pending events behind, new ones are dropped and counted. A lost connection is
+    reopened with exponential backoff, and until then events only reach the players on this worker.
+    """
+
+    def __init__(self, host: str, port: int, max_pending: int = 10_000, max_backoff: float = 5.0):
+        self.host = host
+        self.port = port
+        self.max_backoff = max_backoff
+        self._deliver: Deliver | None = None
+        self._queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=max_pending)
+        self._connected = False
+        self._task: asyncio.Task | None = None
+
+    def publish(self, game_id: str, seq: int, player_ids: list[str], data: str):
+        if not self._connected:
+            # Not connected (yet), so at least the players connected to this worker get it
+            if self._deliver is not None:
+                self._deliver(game_id, seq, player_ids, data)
+            return
+        message = json.dumps({"game": game_id, "seq": seq, "players": player_ids, "data": data}).encode() + b"\n"
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+        # The first attempt is waited for, so a relay that is up from the start carries every event
+        connection = await self._connect()
+        self._task = asyncio.create_task(self._run(connection))
+
+    async def _connect(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter] | None:
+        try:
+            return await asyncio.open_connection(self.host, self.port, limit=2 ** 22)
+        except OSError:
+            return None
+
+    async def _run(self, connection: tuple[asyncio.StreamReader, asyncio.StreamWriter] | None):
+        backoff = 0.1
+        while True:
+            if connection is None:
+                logger.warning("Can't reach the event relay", extra={"relay": f"{self.host}:{self.port}", "retry_in": backoff})
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                connection = await self._connect()
+                continue
+            backoff = 0.1
+            reader, writer = connection
+            self._connected = True
+            tasks = {asyncio.create_task(self._read(reader)), asyncio.create_task(self._write(writer))}
+            try:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                self._connected = False
+                for task in tasks:
+                    task.cancel()
+                writer.close()
+            logger.warning("Lost the connection to the event relay, reconnecting", extra={"relay": f"{self.host}:{self.port}"})
+            connection = await self._connect()
+
+    async def _read(self, reader: asyncio.StreamReader):
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                self._deliver(message["game"], message["seq"], message["players"], message["data"])
+        except ConnectionError:
+            pass
+
+    async def _write(self, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                writer.write(await self._queue.get())
+                await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+async def serve_relay(host: str, port: int) -> asyncio.Server:
+    """Starts the relay SocketBrokers connect to. Each line received is written to every connection."""
+    writers: set[asyncio.StreamWriter] = set()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writers.add(writer)
+        try:
+            while line := await reader.readline():
+                for w in list(writers):
+                    w.write(line)
+        finally:
+            writers.discard(writer)
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port, limit=2 ** 22)
+
+
+def create_broker(address: str | None) -> Broker | None:
+    """SocketBroker for a host:port relay address, or None to deliver events directly."""
+    if not address:
+        return None
+    host, port = address.rsplit(":", 1)
+    return SocketBroker(host, int(port))
@@ -0,0 +1,58 @@
+"""Runs the server as several worker processes behind a router, all on one machine.
+
+    python -m server.cluster --workers 4 --port 8000
+
+Each worker runs main.py on its own port and owns the games that hash to it. The router listens on the
+public port and forwards each request to the worker owning its game. Events travel between workers through
+a relay on broker_port.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+
+import uvicorn
+
+from server.broker import serve_relay
+from server.router import create_router
+
+
+async def run(workers: int, host: str, port: int, broker_port: int):
+    relay = await serve_relay("127.0.0.1", broker_port)
+    worker_urls = [f"http://127.0.0.1:{port + 1 + i}" for i in range(workers)]
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port + 1 + i)],
+            env={
+                **os.environ,
+                "CLUSTER_WORKERS": ",".join(worker_urls),
+                "CLUSTER_WORKER_INDEX": str(i),
+                "CLUSTER_BROKER": f"127.0.0.1:{broker_port}",
+            },
+        )
+        for i in range(workers)
+    ]
+    try:
+        server = uvicorn.Server(uvicorn.Config(create_router(worker_urls), host=host, port=port))
+        await server.serve()
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+        relay.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000, help="Public port; workers use the ports after it")
+    parser.add_argument("--broker-port", type=int, default=7999)
+    args = parser.parse_args()
+    asyncio.run(run(args.workers, args.host, args.port, args.broker_port))
+
+
+if __name__ == "__main__":
+    main()
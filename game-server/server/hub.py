@@ -0,0 +1,237 @@
+from collections import OrderedDict, deque
+from typing import Literal
+import asyncio
+import json
+
+from server.broker import Broker
+
+OverflowPolicy = Literal["drop_oldest", "disconnect"]
+
+# Sent to a subscriber that was disconnected for falling behind, so it knows to refetch the game state
+RESYNC_EVENT = json.dumps({"type": "resync"})
+
+
+def resync_event(game_id: str) -> str:
+    """Sent to a resuming subscriber whose missed events of a game are no longer buffered."""
+    return json.dumps({"type": "resync", "game_id": game_id})
+
+def parse_cursor(last_event_id: str | None) -> dict[str, int]:
+    """Reads an event ID written by Subscriber.cursor. Malformed parts are ignored."""
+    positions = {}
+    for part in (last_event_id or "").split(","):
+        game_id, _, seq = part.rpartition(":")
+        if game_id and seq.isdigit():
+            positions[game_id] = int(seq)
+    return positions
+
+
+class Subscriber:
+    """One open event stream for a player, with a bounded buffer of encoded events."""
+
+    def __init__(self, player_id: str, max_buffer: int, overflow: OverflowPolicy, positions: dict[str, int] | None = None):
+        self.player_id = player_id
+        self.overflow = overflow
+        self.closed = False
+        self.dropped = 0
+        # Sequence number of the last event taken from the buffer, per game
+        self.positions = {} if positions is None else positions
+        self._buffer: deque[tuple[str | None, int, str]] = deque(maxlen=max_buffer)
+        self._ready = asyncio.Event()
+
+    def push(self, data: str, game_id: str | None = None, seq: int = 0):
+        if self.closed:
+            return
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+            if self.overflow == "disconnect":
+                self._buffer.clear()
+                self._buffer.append((None, 0, RESYNC_EVENT))
+                self.closed = True
+                self._ready.set()
+                return
+        # With drop_oldest the deque discards the oldest event itself
+        self._buffer.append((game_id, seq, data))
+        self._ready.set()
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    def depth(self) -> int:
+        return len(self._buffer)
+
+    def cursor(self) -> str:
+        """ID for the stream's latest event: where the stream is in each game, for Last-Event-ID on reconnect."""
+        return ",".join(f"{game_id}:{seq}" for game_id, seq in self.positions.items())
+
+    async def get(self) -> str | None:
+        """Returns the next event, or None once the subscriber is closed and drained."""
+        item = await self.get_item()
+        return None if item is None else item[2]
+
+    async def get_item(self) -> tuple[str | None, int, str] | None:
+        """Like get, but returns the event's game and sequence number with it."""
+        while not self._buffer:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        return self._take()
+
+    def drain(self) -> list[tuple[str | None, int, str]]:
+        """Takes every buffered event without waiting."""
+        return [self._take() for _ in range(len(self._buffer))]
+
+    def _take(self) -> tuple[str | None, int, str]:
+        game_id, seq, data = item = self._buffer.popleft()
+        if game_id is not None:
+            self.positions[game_id] = max(seq, self.positions.get(game_id, 0))
+        return item
+
+
+class ReplayBuffer:
+    """The latest events of one game with who they went to, so resuming streams can be sent what they missed."""
+
+    def __init__(self, size: int):
+        self._events: deque[tuple[int, frozenset[str], str]] = deque(maxlen=size)
+        # Every event of the game after this sequence number is in the buffer
+        self._complete_after: int | None = None
+        self.player_ids: set[str] = set()
+
+    def append(self, seq: int, player_ids: list[str], data: str):
+        if self._complete_after is None:
+            # Whatever came before was published before this hub started keeping the game's events
+            self._complete_after = seq - 1
+        elif len(self._events) == self._events.maxlen:
+            self._complete_after = self._events[0][0]
+        self._events.append((seq, frozenset(player_ids), data))
+        self.player_ids.update(player_ids)
+
+    @property
+    def last_seq(self) -> int:
+        return self._events[-1][0] if self._events else 0
+
+    def since(self, seq: int, player_id: str) -> list[tuple[int, str]] | None:
+        """The player's events after seq, or None if some of the game's events after seq were already dropped."""
+        if self._complete_after is not None and seq < self._complete_after:
+            return None
+        return [(s, data) for s, player_ids, data in self._events if s > seq and player_id in player_ids]
+
+
+class EventHub:
+    """Fans events out from games to the event streams of the players in them.
+
+    Publishing is a single synchronous pass over the game's players; nothing is buffered for players
+    without an open stream, and subscribers are dropped as soon as their stream ends. With a broker, the
+    players' streams may be open on other workers, so events go through the broker to be delivered.
+
+    Every event carries its game's version as a sequence number. The hub that delivers it keeps the game's
+    last replay_size events, so a stream reopened with the cursor of the last event it got (Last-Event-ID)
+    is sent just what it missed.
+    """
+
+    def __init__(
+        self,
+        max_buffer: int = 64,
+        overflow: OverflowPolicy = "drop_oldest",
+        broker: Broker | None = None,
+        replay_size: int = 32,
+        max_replay_games: int = 10_000,
+    ):
+        self.max_buffer = max_buffer
+        self.overflow = overflow
+        self.broker = broker
+        self.replay_size = replay_size
+        self.max_replay_games = max_replay_games
+        self._game_players: dict[str, set[str]] = {}
+        self._player_games: dict[str, set[str]] = {}
+        self._player_subscribers: dict[str, set[Subscriber]] = {}
+        # Least recently published last; with a broker this includes games owned by other workers
+        self._replay: OrderedDict[str, ReplayBuffer] = OrderedDict()
+
+    def add_player(self, game_id: str, player_id: str):
+        self._game_players.setdefault(game_id, set()).add(player_id)
+        self._player_games.setdefault(player_id, set()).add(game_id)
+
+    def remove_game(self, game_id: str):
+        player_ids = self._game_players.pop(game_id, set())
+        replay = self._replay.pop(game_id, None)
+        if replay is not None:
+            player_ids |= replay.player_ids
+        self._unindex(game_id, player_ids)
+
+    def _unindex(self, game_id: str, player_ids: set[str]):
+        for player_id in player_ids:
+            games = self._player_games.get(player_id)
+            if games is None:
+                continue
+            games.discard(game_id)
+            if not games:
+                del self._player_games[player_id]
+
+    def in_game(self, game_id: str, player_id: str) -> bool:
+        return game_id in self._player_games.get(player_id, ())
+
+    def games_of(self, player_id: str) -> set[str]:
+        return self._player_games.get(player_id, set())
+
+    def subscribe(self, player_id: str, last_event_id: str | None = None) -> Subscriber:
+        """Opens a stream for a player. Given the ID of the last event a previous stream got, the new one starts
+        with the events it missed since, or a resync event for games it missed too much of."""
+        game_ids = self.games_of(player_id)
+        positions = {game_id: seq for game_id, seq in parse_cursor(last_event_id).items() if game_id in game_ids}
+        subscriber = Subscriber(player_id, self.max_buffer, self.overflow, positions)
+        for game_id in game_ids:
+            replay = self._replay.get(game_id)
+            if replay is None:
+                continue
+            if last_event_id is None:
+                positions[game_id] = replay.last_seq
+                continue
+            missed = replay.since(positions.get(game_id, 0), player_id)
+            if missed is None:
+                subscriber.push(resync_event(game_id), game_id, replay.last_seq)
+                continue
+            for seq, data in missed:
+                subscriber.push(data, game_id, seq)
+        self._player_subscribers.setdefault(player_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscriber.close()
+        subscribers = self._player_subscribers.get(subscriber.player_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._player_subscribers[subscriber.player_id]
+
+    def publish(self, game_id: str, seq: int, data: str, exclude: str | None = None):
+        player_ids = [p for p in self._game_players.get(game_id, ()) if p != exclude]
+        if self.broker is not None:
+            self.broker.publish(game_id, seq, player_ids, data)
+        else:
+            self.deliver(game_id, seq, player_ids, data)
+
+    def deliver(self, game_id: str, seq: int, player_ids: list[str], data: str):
+        """Pushes an event to the streams the given players have open here, keeping it for replay."""
+        replay = self._replay.get(game_id)
+        if replay is None:
+            replay = self._replay[game_id] = ReplayBuffer(self.replay_size)
+            if len(self._replay) > self.max_replay_games:
+                # Games owned elsewhere are never removed here, so drop the one that went quiet longest
+                old_game_id, old = self._replay.popitem(last=False)
+                self._unindex(old_game_id, old.player_ids - self._game_players.get(old_game_id, set()))
+        else:
+            self._replay.move_to_end(game_id)
+        replay.append(seq, player_ids, data)
+        for player_id in player_ids:
+            self._player_games.setdefault(player_id, set()).add(game_id)
+            for subscriber in self._player_subscribers.get(player_id, ()):
+                subscriber.push(data, game_id, seq)
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._player_subscribers.values())
+
+    def queue_depths(self) -> list[int]:
+        return [s.depth() for subscribers in self._player_subscribers.values() for s in subscribers]
@@ -0,0 +1,455 @@
+"""Load test: simulated players create and join games, listen to their event streams and play them out.
+
+    python -m server.loadtest --players 2000 --seats 3 --duration 60
+    python -m server.loadtest --url http://127.0.0.1:8000 --server-pid 1234
+
+Without --url the app runs in this process and requests reach it straight through ASGI, so the numbers are
+for the app alone, without any network or server in between (though the simulated players share its event
+loop). Prints a JSON report with latency percentiles
+per endpoint, the lag from submitting the action that completes a turn to its event arriving on each
+player's stream, and the server's RSS over time.
+"""
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    """Nearest-rank percentiles of samples, in milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    summary = {f"p{q:g}": ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))] * 1000 for q in PERCENTILES}
+    summary["max"] = ordered[-1] * 1000
+    return summary
+
+def rss_bytes(pid: int | str = "self") -> int | None:
+    """Resident set size of a process, or None where /proc isn't available."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+@asynccontextmanager
+async def asgi_stream(app, path: str) -> AsyncIterator[AsyncIterator[bytes]]:
+    """GETs path from an ASGI app, entering once the response has started. Yields an iterator over the
+    body as it is sent; httpx's ASGITransport waits for the whole body, which for an event stream never comes.
+    """
+    messages: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+    disconnected = asyncio.Event()
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def next_message() -> dict[str, Any] | None:
+        get = asyncio.ensure_future(messages.get())
+        await asyncio.wait((get, task), return_when=asyncio.FIRST_COMPLETED)
+        if get.done():
+            return get.result()
+        get.cancel()
+        task.result()
+        return None
+
+    async def body() -> AsyncIterator[bytes]:
+        while (message := await next_message()) is not None:
+            if message["type"] == "http.response.body":
+                if message.get("body"):
+                    yield message["body"]
+                if not message.get("more_body", False):
+                    return
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"loadtest"), (b"accept", b"text/event-stream")],
+        "client": ("127.0.0.1", 0),
+        "server": ("loadtest", 80),
+    }
+    task = asyncio.create_task(app(scope, receive, messages.put))
+    try:
+        start = await next_message()
+        if start is None or start["type"] != "http.response.start" or start["status"] >= 400:
+            raise httpx.HTTPError(f"GET {path} failed to start streaming")
+        yield body()
+    finally:
+        disconnected.set()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+async def sse_events(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """The data of each server-sent event in a stream of body chunks."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk.replace(b"\r\n", b"\n")
+        while b"\n\n" in buffer:
+            raw, buffer = buffer.split(b"\n\n", 1)
+            data = [line[5:].lstrip(b" ") for line in raw.split(b"\n") if line.startswith(b"data:")]
+            # Comments (keepalive pings) and events with only an ID have no data
+            if any(data):
+                yield b"\n".join(data).decode()
+
+
+class Target:
+    """Where the load goes: the app in this process, or a server at a URL."""
+
+    def __init__(self, app=None, url: str | None = None):
+        self.app = app
+        transport = httpx.ASGITransport(app) if app is not None else None
+        self.client = httpx.AsyncClient(
+            transport=transport,
+            base_url=url or "http://loadtest",
+            timeout=httpx.Timeout(30.0),
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=None),
+        )
+
+    @asynccontextmanager
+    async def stream(self, path: str) -> AsyncIterator[AsyncIterator[str]]:
+        """Opens an event stream, entering once the server has subscribed it."""
+        if self.app is not None:
+            async with asgi_stream(self.app, path) as body:
+                yield sse_events(body)
+            return
+        async with self.client.stream("GET", path, timeout=httpx.Timeout(30.0, read=None)) as response:
+            response.raise_for_status()
+            yield sse_events(response.aiter_bytes())
+
+    async def close(self):
+        await self.client.aclose()
+
+
+@dataclass
+class Report:
+    latencies: defaultdict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: defaultdict[str, int] = field(default_factory=lambda: defaultdict(int))
+    event_lags: list[float] = field(default_factory=list)
+    event_timeouts: int = 0
+    games_started: int = 0
+    games_finished: int = 0
+    turns: int = 0
+    rss: list[tuple[float, int]] = field(default_factory=list)
+
+    def to_dict(self, elapsed: float) -> dict[str, Any]:
+        requests = sum(len(v) for v in self.latencies.values())
+        rss = [b for _, b in self.rss]
+        return {
+            "elapsed": elapsed,
+            "requests_per_second": requests / elapsed,
+            "turns_per_second": self.turns / elapsed,
+            "games_started": self.games_started,
+            "games_finished": self.games_finished,
+            "turns": self.turns,
+            "endpoints": {
+                endpoint: {"count": len(samples), "errors": self.errors.get(endpoint, 0), **percentiles(samples)}
+                for endpoint, samples in sorted(self.latencies.items())
+            },
+            "event_lag": {"count": len(self.event_lags), "timeouts": self.event_timeouts, **percentiles(self.event_lags)},
+            "rss": {
+                "start": rss[0], "peak": max(rss), "end": rss[-1],
+                "samples": [[round(t, 3), b] for t, b in self.rss],
+            } if rss else None,
+        }
+
+
+class Table:
+    """What one table of simulated players knows about its current game, kept up to date from events."""
+
+    def __init__(self, game: dict[str, Any]):
+        self.game_id = game["game_id"]
+        self.changed = asyncio.Condition()
+        self.reset(game)
+        # When the last action of the turn leading to each version was submitted
+        self.submitted: dict[int, float] = {}
+
+    def reset(self, game: dict[str, Any]):
+        self.version = game["version"]
+        self.deck_size = game["state"]["deck"]["size"]
+        self.players = {
+            p["id"]: {"eliminated": p["eliminated"], "discard": len(p["discard_pile"]["cards"])}
+            for p in game["state"]["players"]
+        }
+
+    def apply(self, event: dict[str, Any]) -> bool:
+        """Applies an event's delta. False if an event was missed and the game needs refetching."""
+        if event["version"] <= self.version:
+            return True
+        if event["version"] != self.version + 1:
+            return False
+        delta = event["delta"]
+        if "deck" in delta:
+            self.deck_size = delta["deck"]["size"]
+        for change in delta["players"]:
+            if "player" in change:
+                p = change["player"]
+                self.players[change["id"]] = {"eliminated": p["eliminated"], "discard": len(p["discard_pile"]["cards"])}
+                continue
+            player = self.players[change["id"]]
+            if "eliminated" in change:
+                player["eliminated"] = change["eliminated"]
+            if "discard_pile" in change:
+                player["discard"] = len(change["discard_pile"]["cards"])
+        self.version = event["version"]
+        return True
+
+    @property
+    def alive(self) -> list[str]:
+        return [pid for pid, p in self.players.items() if not p["eliminated"]]
+
+    def playable(self, actions: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Actions that can't fail to resolve: no taking from empty discard piles, and no drawing from a deck
+        that might run out if everyone draws."""
+        def ok(action: dict[str, Any]) -> bool:
+            if action["type"] != "take":
+                return True
+            obj = action["object_to_take"]
+            if obj["type"] == "deck":
+                return self.deck_size >= len(self.alive)
+            if obj["type"] == "discard":
+                return self.players[obj["player_id"]]["discard"] > 0
+            return True
+        return [a for a in actions if ok(a)]
+
+
+class LoadTest:
+    def __init__(self, target: Target, players: int, seats: int, duration: float, ramp: float = 5.0,
+                 think: float = 0.0, max_turns: int = 200, event_timeout: float = 10.0, seed: int = 0):
+        self.target = target
+        self.players = players
+        self.seats = seats
+        self.duration = duration
+        self.ramp = ramp
+        self.think = think
+        self.max_turns = max_turns
+        self.event_timeout = event_timeout
+        self.rng = random.Random(seed)
+        self.report = Report()
+        self.tables: dict[str, Table] = {}
+        self.deadline = 0.0
+
+    async def request(self, endpoint: str, method: str, path: str, **kwargs) -> httpx.Response | None:
+        start = time.perf_counter()
+        try:
+            response = await self.target.client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            self.report.errors[endpoint] += 1
+            return None
+        self.report.latencies[endpoint].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.report.errors[endpoint] += 1
+            return None
+        return response
+
+    async def listen(self, player_id: str, connected: asyncio.Event):
+        """Reads a player's event stream, timing each turn's event and keeping the tables up to date."""
+        endpoint = "GET /players/{player_id}/events"
+        start = time.perf_counter()
+        try:
+            async with self.target.stream(f"/api/v1/players/{player_id}/events") as events:
+                self.report.latencies[endpoint].append(time.perf_counter() - start)
+                connected.set()
+                async for data in events:
+                    received = time.perf_counter()
+                    event = json.loads(data)
+                    if event["type"] == "resync":
+                        # Events were missed and a resync has no version, so start over from the game's state.
+                        # One without a game_id ends a stream that fell behind, and covers all of its games.
+                        game_id = event.get("game_id")
+                        for table in list(self.tables.values()):
+                            if table.game_id == game_id or (game_id is None and player_id in table.players):
+                                async with table.changed:
+                                    await self.refetch(table)
+                                    table.changed.notify_all()
+                        continue
+                    table = self.tables.get(event.get("game_id"))
+                    if table is None:
+                        continue
+                    submitted = table.submitted.get(event["version"])
+                    if submitted is not None and event["type"] == "actions_performed":
+                        self.report.event_lags.append(received - submitted)
+                    async with table.changed:
+                        if not table.apply(event):
+                            await self.refetch(table)
+                        table.changed.notify_all()
+        except httpx.HTTPError:
+            self.report.errors[endpoint] += 1
+        finally:
+            # Let the table go ahead (without this player's events) rather than wait forever
+            connected.set()
+
+    async def refetch(self, table: Table):
+        response = await self.request("GET /games/{game_id}", "GET", f"/api/v1/games/{table.game_id}")
+        if response is not None:
+            table.reset(response.json())
+
+    async def move(self, table: Table, player_id: str, version: int):
+        if self.think:
+            await asyncio.sleep(self.rng.expovariate(1 / self.think))
+        response = await self.request(
+            "GET /players/{player_id}/games/{game_id}/actions", "GET",
+            f"/api/v1/players/{player_id}/games/{table.game_id}/actions",
+        )
+        if response is None:
+            return
+        actions = table.playable(response.json())
+        if not actions:
+            return
+        table.submitted[version + 1] = time.perf_counter()
+        await self.request(
+            "POST /players/{player_id}/games/{game_id}/actions", "POST",
+            f"/api/v1/players/{player_id}/games/{table.game_id}/actions", json=self.rng.choice(actions),
+        )
+
+    async def play_game(self, player_ids: list[str]) -> bool:
+        host, *guests = player_ids
+        response = await self.request("POST /players/{player_id}/games/create", "POST", f"/api/v1/players/{host}/games/create")
+        if response is None:
+            return False
+        game = response.json()
+        table = self.tables[game["game_id"]] = Table(game)
+        self.report.games_started += 1
+        try:
+            for guest in guests:
+                response = await self.request(
+                    "POST /players/{player_id}/games/{game_id}/join", "POST",
+                    f"/api/v1/players/{guest}/games/{table.game_id}/join",
+                )
+                if response is None:
+                    return False
+                async with table.changed:
+                    table.reset(response.json())
+            for _ in range(self.max_turns):
+                if len(table.alive) <= 1:
+                    self.report.games_finished += 1
+                    return True
+                if time.perf_counter() >= self.deadline:
+                    return True
+                version = table.version
+                await asyncio.gather(*(self.move(table, pid, version) for pid in table.alive))
+                async with table.changed:
+                    try:
+                        await asyncio.wait_for(table.changed.wait_for(lambda: table.version > version), self.event_timeout)
+                    except asyncio.TimeoutError:
+                        self.report.event_timeouts += 1
+                        await self.refetch(table)
+                        if table.version == version:
+                            # Nothing resolved, e.g. a move failed; start a new game
+                            return False
+                self.report.turns += 1
+            return True
+        finally:
+            self.tables.pop(table.game_id, None)
+
+    async def run_table(self, delay: float):
+        await asyncio.sleep(delay)
+        player_ids = []
+        for _ in range(self.seats):
+            response = await self.request("POST /players", "POST", "/api/v1/players")
+            if response is None:
+                return
+            player_ids.append(response.json()["player_id"])
+        connected = [asyncio.Event() for _ in player_ids]
+        listeners = [asyncio.create_task(self.listen(pid, c)) for pid, c in zip(player_ids, connected)]
+        try:
+            await asyncio.gather(*(c.wait() for c in connected))
+            while time.perf_counter() < self.deadline:
+                await self.play_game(player_ids)
+        finally:
+            for listener in listeners:
+                listener.cancel()
+            await asyncio.gather(*listeners, return_exceptions=True)
+
+    async def sample_rss(self, pid: int | str, interval: float, start: float):
+        while True:
+            rss = rss_bytes(pid)
+            if rss is not None:
+                self.report.rss.append((time.perf_counter() - start, rss))
+            await asyncio.sleep(interval)
+
+    async def run(self, rss_pid: int | str | None = "self", rss_interval: float = 1.0) -> dict[str, Any]:
+        start = time.perf_counter()
+        self.deadline = start + self.duration
+        sampler = asyncio.create_task(self.sample_rss(rss_pid, rss_interval, start)) if rss_pid is not None else None
+        tables = self.players // self.seats
+        try:
+            await asyncio.gather(*(self.run_table(self.ramp * i / max(1, tables)) for i in range(tables)))
+        finally:
+            if sampler is not None:
+                sampler.cancel()
+        if rss_pid is not None and (rss := rss_bytes(rss_pid)) is not None:
+            self.report.rss.append((time.perf_counter() - start, rss))
+        return self.report.to_dict(time.perf_counter() - start)
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    if args.url is None:
+        # Imported here: main sets up the whole server (and reads config.yaml) on import
+        from main import app
+
+        target = Target(app=app)
+        rss_pid = "self"
+    else:
+        app = None
+        target = Target(url=args.url)
+        rss_pid = args.server_pid
+    test = LoadTest(
+        target, args.players, args.seats, args.duration,
+        ramp=args.ramp, think=args.think, max_turns=args.max_turns, event_timeout=args.event_timeout, seed=args.seed,
+    )
+    try:
+        if app is None:
+            return await test.run(rss_pid, args.rss_interval)
+        async with app.router.lifespan_context(app):
+            return await test.run(rss_pid, args.rss_interval)
+    finally:
+        await target.close()
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="server to load; by default main.app is loaded in this process")
+    parser.add_argument("--server-pid", type=int, help="process to sample RSS of when using --url")
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--seats", type=int, default=2, help="players per game")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to keep starting turns for")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which tables join")
+    parser.add_argument("--think", type=float, default=0.0, help="mean seconds a player waits before each move")
+    parser.add_argument("--max-turns", type=int, default=200, help="turns before a game is abandoned")
+    parser.add_argument("--event-timeout", type=float, default=10.0)
+    parser.add_argument("--rss-interval", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    # One log line per request would cost more than the requests
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("server").setLevel(logging.WARNING)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
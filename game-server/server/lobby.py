@@ -0,0 +1,173 @@
+from dataclasses import asdict
+from hashlib import blake2b
+from typing import Any, Awaitable, Callable, Iterable, Iterator
+import asyncio
+import json
+
+from gamestate.config import GameConfig
+from gamestate.evaluate import is_terminal_state
+from gamestate.game_state import GameState
+
+
+def config_variant(config: GameConfig) -> str:
+    """Short name for a game configuration; only games of the same variant are matched together."""
+    return blake2b(json.dumps(asdict(config), sort_keys=True).encode(), digest_size=4).hexdigest()
+
+def open_seats(state: GameState, config: GameConfig, table_size: int) -> int:
+    """How many more players the game can seat: none once it's over, and no more than the deck can deal in."""
+    if len(state.players) > 1 and is_terminal_state(state):
+        return 0
+    return max(0, min(table_size - len(state.players), len(state.deck.cards) // config.initial_hand_size))
+
+
+class Lobby:
+    """Joinable games, bucketed by variant and number of open seats.
+
+    Every change is a move between buckets, and finding a seat looks at one bucket per seat count, so
+    nothing ever walks the list of games. Within a bucket games stay in the order they opened up. Seats
+    handed out by reserve count as taken until they are released, so concurrent quick-joins can't
+    overfill a table while their joins are in flight.
+    """
+
+    def __init__(self, table_size: int):
+        self.table_size = table_size
+        # variant -> open seats -> game ids (a dict as an insertion-ordered set)
+        self._buckets: dict[str, dict[int, dict[str, None]]] = {}
+        # game id -> (variant, open seats before reservations)
+        self._games: dict[str, tuple[str, int]] = {}
+        self._reserved: dict[str, int] = {}
+        self._indexed: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._indexed)
+
+    def update(self, game_id: str, variant: str, seats: int):
+        self._games[game_id] = (variant, seats)
+        self._reindex(game_id)
+
+    def remove(self, game_id: str):
+        self._unindex(game_id)
+        self._games.pop(game_id, None)
+        self._reserved.pop(game_id, None)
+
+    def reserve(self, variant: str, exclude: Iterable[str] = ()) -> str | None:
+        """Takes a seat at the fullest joinable game of variant, oldest first, skipping the excluded games."""
+        buckets = self._buckets.get(variant)
+        if not buckets:
+            return None
+        exclude = set(exclude)
+        for seats in range(1, self.table_size):
+            for game_id in buckets.get(seats, ()):
+                if game_id not in exclude:
+                    self._reserved[game_id] = self._reserved.get(game_id, 0) + 1
+                    self._reindex(game_id)
+                    return game_id
+        return None
+
+    def release(self, game_id: str):
+        """Gives back a seat from reserve, once the player has joined (or failed to)."""
+        reserved = self._reserved.get(game_id, 0) - 1
+        if reserved > 0:
+            self._reserved[game_id] = reserved
+        else:
+            self._reserved.pop(game_id, None)
+        if game_id in self._games:
+            self._reindex(game_id)
+
+    def open_games(self, variant: str | None = None, limit: int = 50) -> Iterator[tuple[str, str, int]]:
+        """(game_id, variant, open seats) of joinable games, fullest first."""
+        variants = [variant] if variant is not None else list(self._buckets)
+        count = 0
+        for seats in range(1, self.table_size):
+            for v in variants:
+                for game_id in self._buckets.get(v, {}).get(seats, ()):
+                    if count == limit:
+                        return
+                    count += 1
+                    yield game_id, v, seats
+
+    def _reindex(self, game_id: str):
+        self._unindex(game_id)
+        variant, seats = self._games[game_id]
+        seats -= self._reserved.get(game_id, 0)
+        if seats > 0:
+            self._buckets.setdefault(variant, {}).setdefault(seats, {})[game_id] = None
+            self._indexed[game_id] = seats
+
+    def _unindex(self, game_id: str):
+        seats = self._indexed.pop(game_id, None)
+        if seats is None:
+            return
+        variant, _ = self._games[game_id]
+        bucket = self._buckets[variant][seats]
+        del bucket[game_id]
+        if not bucket:
+            del self._buckets[variant][seats]
+            if not self._buckets[variant]:
+                del self._buckets[variant]
+
+
+class Matchmaker:
+    """Seats quick-join arrivals that found no open game at new tables, in batches.
+
+    Arrivals wait up to window seconds for others to share a table with; a table starts as soon as it is
+    full, or when the wait is over with however many arrived (even one, whose game then opens up in the
+    lobby for the next arrivals). start_table seats the players and returns what each of them gets back.
+    """
+
+    def __init__(self, table_size: int, window: float, start_table: Callable[[list[str]], Awaitable[Any]]):
+        self.table_size = table_size
+        self.window = window
+        self.start_table = start_table
+        self._waiting: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    async def wait_for_table(self, player_id: str) -> Any:
+        if any(waiting_id == player_id for waiting_id, _ in self._waiting):
+            raise ValueError(f"Player with id {player_id} is already waiting for a table.")
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append((player_id, future))
+        if len(self._waiting) >= self.table_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiting:
+            batch, self._waiting = self._waiting[:self.table_size], self._waiting[self.table_size:]
+            # Players who gave up waiting don't get a seat
+            batch = [(player_id, future) for player_id, future in batch if not future.done()]
+            if batch:
+                task = asyncio.create_task(self._start(batch))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _start(self, batch: list[tuple[str, asyncio.Future]]):
+        try:
+            result = await self.start_table([player_id for player_id, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for _, future in batch:
+            if not future.done():
+                future.set_result(result)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for _, future in self._waiting:
+            future.cancel()
+        self._waiting = []
+        for task in self._tasks:
+            task.cancel()
@@ -0,0 +1,40 @@
+from typing import Any
+import httpx
+
+from server.sharding import ClusterConfig
+
+
+class Peers:
+    """Requests to the other workers of a cluster, for what this worker can't answer itself: the games
+    another worker owns, and the open seats of the whole cluster.
+
+    Workers talk to each other directly, not through the router. Without a cluster there are no peers.
+    """
+
+    def __init__(self, cluster: ClusterConfig, timeout: float = 10.0):
+        self.cluster = cluster
+        self.ring = cluster.ring() if cluster.enabled else None
+        self.url = cluster.worker_urls[cluster.worker_index] if cluster.enabled else None
+        self.timeout = timeout
+        self._client: httpx.AsyncClient | None = None
+
+    def owner(self, game_id: str) -> str | None:
+        """URL of the worker owning game_id, or None if it is this one."""
+        if self.ring is None:
+            return None
+        worker = self.ring.node_for(game_id)
+        return None if worker == self.url else worker
+
+    def others(self) -> list[str]:
+        return [url for url in self.cluster.worker_urls if url != self.url] if self.cluster.enabled else []
+
+    async def request(self, worker: str, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        if self._client is None:
+            # Created on first use, inside the event loop it serves
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return await self._client.request(method, worker + path, **kwargs)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
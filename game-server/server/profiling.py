@@ -0,0 +1,110 @@
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+import asyncio
+import itertools
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StackSampler:
+    """Sampling profiler for one thread: records the thread's stack every interval seconds on a helper thread.
+
+    Stacks are kept in the folded format flame graph tools read ("outer;inner;innermost count"). It samples
+    whatever the thread runs, so for the event loop thread that includes other requests interleaved with
+    the profiled one.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[fold(frame)] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def fold(frame: FrameType | None) -> str:
+    names = []
+    while frame is not None:
+        names.append(f"{frame.f_code.co_name} ({Path(frame.f_code.co_filename).name}:{frame.f_code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class ProfilerMiddleware:
+    """Profiles a sample of requests with a StackSampler and writes each profile to directory.
+
+    Turned on by setting PROFILE_SAMPLE_RATE (the fraction of requests to profile). While it's on, a request
+    with an x-profile header is always profiled.
+    """
+
+    def __init__(self, app, sample_rate: float, directory: str = "profiles", interval: float = 0.001):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.directory = Path(directory)
+        self.interval = interval
+        # Keeps names unique when requests to the same path finish within a second, also across the
+        # workers of a cluster sharing the directory
+        self._count = itertools.count()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            elapsed = time.perf_counter() - start
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._count)}-{scope['method']}{scope['path'].replace('/', '_')}.folded"
+            # Joining the sampler and writing the file block, so neither runs on the event loop
+            path = await asyncio.to_thread(self._write, sampler, name)
+            logger.info("Profiled request", extra={"method": scope["method"], "path": scope["path"], "seconds": elapsed, "profile": str(path)})
+
+    def _write(self, sampler: StackSampler, name: str) -> Path:
+        sampler.stop()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / name
+        path.write_text(sampler.folded())
+        return path
+
+    def _should_profile(self, scope) -> bool:
+        if any(name == b"x-profile" for name, _ in scope["headers"]):
+            return True
+        return random.random() < self.sample_rate
+
+
+def profiler_options() -> dict | None:
+    """ProfilerMiddleware options from the environment, or None if profiling is off."""
+    rate = os.environ.get("PROFILE_SAMPLE_RATE")
+    if rate is None:
+        return None
+    return {
+        "sample_rate": float(rate),
+        "directory": os.environ.get("PROFILE_DIR", "profiles"),
+        "interval": float(os.environ.get("PROFILE_INTERVAL", "0.001")),
+    }
@@ -0,0 +1,117 @@
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+from websockets.asyncio.client import ClientConnection, connect
+from websockets.exceptions import ConnectionClosed, InvalidHandshake
+import asyncio
+import httpx
+
+from server.sharding import HashRing
+
+# Hop-by-hop headers, which apply to one connection and must not be forwarded
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "te", "trailer", "upgrade", "host", "content-length"}
+
+
+def routing_key(path: str) -> str:
+    """The id a request is routed by: its game if it has one, otherwise its player.
+
+    Game requests must reach the worker that owns the game. Anything else (creating players and games,
+    event streams, sockets) can be served by any worker, so it is spread out by player id.
+    """
+    parts = path.strip("/").split("/")
+    # /api/v1/games/{game_id}/...
+    if parts[2:3] == ["games"] and len(parts) > 3:
+        return parts[3]
+    # /api/v1/players/{player_id}/games/{game_id}/...
+    if parts[2:3] == ["players"] and len(parts) > 5 and parts[4] == "games" and parts[5] != "create":
+        return parts[5]
+    if parts[2:3] == ["players"] and len(parts) > 3:
+        return parts[3]
+    return ""
+
+
+def create_router(worker_urls: list[str]) -> Starlette:
+    """App that forwards every request to the worker owning it, streaming the response back. WebSockets
+    are relayed message by message to a socket opened to the worker."""
+    ring = HashRing(worker_urls)
+    # Event streams stay open indefinitely, so there is no read timeout
+    client = httpx.AsyncClient(timeout=httpx.Timeout(10.0, read=None))
+
+    async def forward(request: Request) -> StreamingResponse:
+        worker = ring.node_for(routing_key(request.url.path))
+        upstream = client.build_request(
+            request.method,
+            worker + request.url.path,
+            params=request.query_params,
+            headers=[(k, v) for k, v in request.headers.items() if k.lower() not in HOP_HEADERS],
+            content=await request.body(),
+        )
+        response = await client.send(upstream, stream=True)
+        return StreamingResponse(
+            response.aiter_raw(),
+            status_code=response.status_code,
+            headers={k: v for k, v in response.headers.items() if k.lower() not in HOP_HEADERS},
+            background=BackgroundTask(response.aclose),
+        )
+
+    async def forward_socket(websocket: WebSocket):
+        worker = ring.node_for(routing_key(websocket.url.path))
+        url = "ws" + worker.removeprefix("http") + websocket.url.path
+        if websocket.url.query:
+            url += "?" + websocket.url.query
+        try:
+            upstream = await connect(url, max_size=None)
+        except (OSError, InvalidHandshake):
+            await websocket.close(code=1011)
+            return
+        await websocket.accept()
+        async with upstream:
+            relays = [asyncio.create_task(relay_up(websocket, upstream)), asyncio.create_task(relay_down(websocket, upstream))]
+            try:
+                await asyncio.wait(relays, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in relays:
+                    task.cancel()
+        try:
+            await websocket.close()
+        except RuntimeError:
+            # The client is already gone
+            pass
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        yield
+        await client.aclose()
+
+    methods = ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+    return Starlette(
+        routes=[Route("/{path:path}", forward, methods=methods), WebSocketRoute("/{path:path}", forward_socket)],
+        lifespan=lifespan,
+    )
+
+
+async def relay_up(websocket: WebSocket, upstream: ClientConnection):
+    """Client to worker, until the client disconnects."""
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            await upstream.send(message["text"] if message.get("text") is not None else message["bytes"])
+    except (WebSocketDisconnect, ConnectionClosed):
+        return
+
+async def relay_down(websocket: WebSocket, upstream: ClientConnection):
+    """Worker to client, until the worker closes the socket."""
+    try:
+        async for message in upstream:
+            if isinstance(message, str):
+                await websocket.send_text(message)
+            else:
+                await websocket.send_bytes(message)
+    except (WebSocketDisconnect, ConnectionClosed):
+        return
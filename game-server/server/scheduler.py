@@ -0,0 +1,128 @@
+from collections import Counter, OrderedDict
+from math import ceil
+from typing import Callable, Hashable, Iterable
+
+from gamestate.game_action import DiscardAction, PlayerAction, ProtectAction, TakeableCard
+
+
+class TimerWheel:
+    """Hashed timing wheel: scheduling and cancelling are O(1), and each tick only looks at one slot.
+
+    Timers are keyed, and scheduling a key that already has a timer replaces it. Time is whatever clock
+    the caller passes to advance, in seconds; timers fire on the first tick at or after their deadline.
+    """
+
+    def __init__(self, now: float, tick: float = 0.1, slots: int = 512):
+        self.tick = tick
+        self._slots: list[dict[Hashable, tuple[int, Callable[[], None]]]] = [{} for _ in range(slots)]
+        self._key_slots: dict[Hashable, int] = {}
+        self._start = now
+        self._current = 0
+
+    def schedule(self, key: Hashable, delay: float, callback: Callable[[], None]):
+        self.cancel(key)
+        deadline = self._current + max(1, ceil(delay / self.tick))
+        slot = deadline % len(self._slots)
+        # Deadlines more than one turn of the wheel away stay in their slot until their turn comes round
+        self._slots[slot][key] = (deadline, callback)
+        self._key_slots[key] = slot
+
+    def cancel(self, key: Hashable):
+        slot = self._key_slots.pop(key, None)
+        if slot is not None:
+            del self._slots[slot][key]
+
+    def __len__(self) -> int:
+        return len(self._key_slots)
+
+    def advance(self, now: float) -> list[Callable[[], None]]:
+        """Moves the wheel up to now and returns the callbacks of the timers that expired, in order."""
+        expired = []
+        target = int((now - self._start) / self.tick)
+        while self._current < target:
+            self._current += 1
+            timers = self._slots[self._current % len(self._slots)]
+            for key, (deadline, callback) in list(timers.items()):
+                if deadline <= self._current:
+                    del timers[key]
+                    del self._key_slots[key]
+                    expired.append(callback)
+        return expired
+
+
+class EvictionTracker:
+    """Decides which games to drop from memory.
+
+    Finished games go after finished_ttl seconds and games nobody has touched go after idle_ttl. If more
+    than max_games are left, finished games and then the least recently touched ones go until the rest
+    fit. max_games stands in for a memory budget: games are close enough in size that counting them is
+    cheaper than measuring them and nearly as accurate. A ttl or max_games of None turns that rule off.
+    """
+
+    def __init__(self, idle_ttl: float | None = 3600, finished_ttl: float | None = 300, max_games: int | None = None):
+        self.idle_ttl = idle_ttl
+        self.finished_ttl = finished_ttl
+        self.max_games = max_games
+        # Ordered by last touch, least recent first
+        self._last_touched: OrderedDict[str, float] = OrderedDict()
+        self._finished_at: dict[str, float] = {}
+        self.evictions: Counter[str] = Counter()
+
+    def touch(self, game_id: str, now: float):
+        self._last_touched[game_id] = now
+        self._last_touched.move_to_end(game_id)
+
+    def mark_finished(self, game_id: str, now: float):
+        self._finished_at.setdefault(game_id, now)
+        self._last_touched.setdefault(game_id, now)
+
+    def forget(self, game_id: str):
+        self._last_touched.pop(game_id, None)
+        self._finished_at.pop(game_id, None)
+
+    def __len__(self) -> int:
+        return len(self._last_touched)
+
+    def collect(self, now: float) -> list[tuple[str, str]]:
+        """Returns (game_id, reason) for every game to evict now, and forgets them."""
+        evicted: list[tuple[str, str]] = []
+
+        def evict(game_ids: Iterable[str], reason: str):
+            for game_id in list(game_ids):
+                self.forget(game_id)
+                self.evictions[reason] += 1
+                evicted.append((game_id, reason))
+
+        if self.finished_ttl is not None:
+            evict((g for g, t in self._finished_at.items() if now - t >= self.finished_ttl), "finished")
+        if self.idle_ttl is not None:
+            idle = []
+            for game_id, t in self._last_touched.items():
+                if now - t < self.idle_ttl:
+                    break
+                idle.append(game_id)
+            evict(idle, "idle")
+        if self.max_games is not None and len(self._last_touched) > self.max_games:
+            excess = len(self._last_touched) - self.max_games
+            finished = sorted(self._finished_at, key=self._finished_at.__getitem__)[:excess]
+            evict(finished, "memory")
+            excess -= len(finished)
+            evict(list(self._last_touched)[:excess], "memory")
+        return evicted
+
+
+def default_action(player_id: str, legal_actions: Iterable[PlayerAction]) -> PlayerAction:
+    """The action submitted for a player who missed the turn deadline: the most passive legal one.
+
+    Protecting their own hand is preferred, then protecting anything else, then discarding; taking from
+    someone is the last resort. Ties go the same way every time.
+    """
+    def passivity(action: PlayerAction) -> tuple[int, str]:
+        if isinstance(action, ProtectAction):
+            obj = action.object_to_protect
+            return (0 if isinstance(obj, TakeableCard) and obj.player_id == player_id else 1), repr(action)
+        if isinstance(action, DiscardAction):
+            return 2, repr(action)
+        return 3, repr(action)
+
+    return min(legal_actions, key=passivity)
@@ -0,0 +1,63 @@
+from bisect import bisect
+from dataclasses import dataclass
+from hashlib import blake2b
+import os
+
+
+def stable_hash(key: str) -> int:
+    """Hash that is the same in every process, unlike hash() on str."""
+    return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of keys onto nodes, with virtual replicas per node to even out the load."""
+
+    def __init__(self, nodes: list[str], replicas: int = 100):
+        self.nodes = list(nodes)
+        points = sorted(
+            (stable_hash(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(replicas)
+        )
+        self._hashes = [h for h, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key: str) -> str:
+        if not self._nodes:
+            raise ValueError("Hash ring has no nodes")
+        i = bisect(self._hashes, stable_hash(key)) % len(self._hashes)
+        return self._nodes[i]
+
+
+@dataclass
+class ClusterConfig:
+    """This worker's place in a multi-worker deployment, read from the environment set by server.cluster.
+
+    With no CLUSTER_WORKERS set the server runs as the only worker and owns every game.
+    """
+    worker_urls: list[str]
+    worker_index: int = 0
+    broker_address: str | None = None
+
+    @staticmethod
+    def from_env() -> "ClusterConfig":
+        workers = os.environ.get("CLUSTER_WORKERS")
+        if not workers:
+            return ClusterConfig(worker_urls=[])
+        return ClusterConfig(
+            worker_urls=workers.split(","),
+            worker_index=int(os.environ.get("CLUSTER_WORKER_INDEX", "0")),
+            broker_address=os.environ.get("CLUSTER_BROKER"),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.worker_urls) > 1
+
+    def ring(self) -> HashRing:
+        return HashRing(self.worker_urls)
+
+    def owns(self, game_id: str, ring: HashRing | None = None) -> bool:
+        if not self.enabled:
+            return True
+        return (ring or self.ring()).node_for(game_id) == self.worker_urls[self.worker_index]
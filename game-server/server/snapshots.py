@@ -0,0 +1,110 @@
+from dataclasses import asdict
+from typing import Any, Iterable
+import json
+
+from gamestate.config import GameConfig
+from gamestate.evaluate import get_showdown_winners
+from gamestate.game_action import PlayerAction
+from gamestate.game_state import GameState
+
+
+def showdown(state: GameState, config: GameConfig) -> list[str] | None:
+    """Once the deck has run out, the ids of the players left holding the best hand (several for a tie).
+    The server decides this; clients only describe the hands."""
+    if len(state.deck.cards) or not state.players:
+        return None
+    return get_showdown_winners(state, config)
+
+def encode_state(state: GameState, config: GameConfig) -> dict[str, Any]:
+    """The state as clients see it. The deck is only its size: its cards are in the order they will be
+    dealt, so showing them would show everyone what they are going to draw."""
+    return {
+        "players": [asdict(p) for p in state.players],
+        "deck": {"size": len(state.deck.cards), "protected": state.deck.protected},
+        "showdown": showdown(state, config),
+    }
+
+def diff_states(old: GameState, new: GameState, config: GameConfig) -> dict[str, Any]:
+    """Returns the parts of the state that changed, in the same shape as encode_state.
+
+    Players are listed only if something about them changed. A new player is sent whole; for an existing
+    player only the changed hand slots and the changed discard pile, wager, stack and eliminated flag are sent.
+    Once the deck is empty, every delta carries the showdown.
+    """
+    old_players = {p.id: p for p in old.players}
+    players = []
+    for p in new.players:
+        old_p = old_players.get(p.id)
+        if old_p is None:
+            players.append({"id": p.id, "player": asdict(p)})
+            continue
+        if old_p == p:
+            continue
+        changes: dict[str, Any] = {"id": p.id}
+        if old_p.hand != p.hand:
+            changes["hand"] = {
+                "size": len(p.hand.cards),
+                "protected": p.hand.protected,
+                "slots": [
+                    [i, asdict(c)]
+                    for i, c in enumerate(p.hand.cards)
+                    if i >= len(old_p.hand.cards) or old_p.hand.cards[i] != c
+                ],
+            }
+        if old_p.discard_pile != p.discard_pile:
+            changes["discard_pile"] = asdict(p.discard_pile)
+        if old_p.wager != p.wager:
+            changes["wager"] = asdict(p.wager)
+        if old_p.stack != p.stack:
+            changes["stack"] = asdict(p.stack)
+        if old_p.eliminated != p.eliminated:
+            changes["eliminated"] = p.eliminated
+        players.append(changes)
+
+    delta: dict[str, Any] = {"players": players}
+    if old.deck != new.deck:
+        delta["deck"] = {"size": len(new.deck.cards), "protected": new.deck.protected}
+    if (winners := showdown(new, config)) is not None:
+        delta["showdown"] = winners
+    return delta
+
+
+class GameSnapshot:
+    """Holds the current state of one game and its JSON encodings, which are built at most once per version."""
+
+    def __init__(self, game_id: str, state: GameState, config: GameConfig, version: int = 0, seed: int | None = None):
+        self.game_id = game_id
+        self.state = state
+        self.config = config
+        self.version = version
+        # What the game's deck was shuffled from, for reproducing it. Never sent to clients: it gives away the deck order.
+        self.seed = seed
+        self._state_json: bytes | None = None
+        self._actions_json: dict[str, bytes] = {}
+
+    def update(self, state: GameState) -> dict[str, Any]:
+        """Moves to the next version and returns the delta from the previous state."""
+        delta = diff_states(self.state, state, self.config)
+        self.state = state
+        self.version += 1
+        self._state_json = None
+        self._actions_json.clear()
+        return delta
+
+    def state_json(self) -> bytes:
+        """Response body for the game: {"game_id", "version", "state"}."""
+        if self._state_json is None:
+            self._state_json = json.dumps({
+                "game_id": self.game_id,
+                "version": self.version,
+                "state": encode_state(self.state, self.config),
+            }).encode()
+        return self._state_json
+
+    def actions_json(self, player_id: str, actions: Iterable[PlayerAction]) -> bytes:
+        """Response body listing a player's legal actions for the current version."""
+        body = self._actions_json.get(player_id)
+        if body is None:
+            body = json.dumps([asdict(x) for x in actions]).encode()
+            self._actions_json[player_id] = body
+        return body
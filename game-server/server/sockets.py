@@ -0,0 +1,126 @@
+"""WebSocket sessions: one connection per player for all of their games, both ways.
+
+Clients send a message, or a list of messages in one frame:
+
+    {"type": "action", "id": 7, "game_id": "ab12", "action": {...}}     a PlayerAction, as for POST .../actions
+    {"type": "action", "id": 8, "game_id": "ab12", "action_id": 13}     or its ID in the game's ActionSpace
+    {"type": "sync", "game_id": "ab12"}                                  ask for the game's state and actions
+
+and get frames of {"cursor": ..., "messages": [...]}. Messages are the events of the SSE stream, acks
+({"type": "ack", "id": 7, "game_id": ...}), errors ({"type": "error", "id": 8, "game_id": ..., "error": ...}),
+and after the events of each game in the frame, the player's legal actions as of the game's latest version
+({"type": "actions", "game_id": ..., "version": ..., "actions": [...]}). Whatever becomes ready within one
+tick goes out as a single frame. The cursor works like the SSE event ID: reconnecting with it as
+?last_event_id= resumes where the frame left off.
+"""
+from typing import Any, Awaitable, Callable
+import asyncio
+import json
+import logging
+
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from server.hub import Subscriber
+
+logger = logging.getLogger(__name__)
+
+# Submits an action message's action for the player; returns an error, or None if it was accepted
+Submit = Callable[[str, dict[str, Any]], Awaitable[str | None]]
+# Encoded messages bringing the player up to date on a game: its state (if asked for) and legal actions.
+# Games owned by another worker of a cluster are looked up there, hence async.
+GameMessages = Callable[[str, bool], Awaitable[list[str]]]
+
+
+def frame(cursor: str, messages: list[str]) -> str:
+    """Joins already encoded messages into a frame without decoding them again."""
+    return f'{{"cursor": {json.dumps(cursor)}, "messages": [{", ".join(messages)}]}}'
+
+
+class PlayerSocket:
+    """Runs one player's WebSocket: a reader handling what the client sends and a writer sending frames.
+
+    Replies share the subscriber's buffer with the player's events, so they are sent in the order things
+    happened and are held to the same bound when the client reads slowly.
+    """
+
+    def __init__(self, websocket: WebSocket, subscriber: Subscriber, submit: Submit, game_messages: GameMessages, tick: float = 0.01):
+        self.websocket = websocket
+        self.subscriber = subscriber
+        self.submit = submit
+        self.game_messages = game_messages
+        self.tick = tick
+        self._tasks: set[asyncio.Task] = set()
+
+    async def run(self, game_ids: list[str]):
+        """Runs until the client disconnects, or the writer gives up on a client that fell behind.
+        Starts by sending the state and legal actions of game_ids."""
+        for game_id in game_ids:
+            await self._sync(game_id)
+        reader = asyncio.create_task(self._read())
+        writer = asyncio.create_task(self._write())
+        try:
+            done, _ = await asyncio.wait((reader, writer), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not isinstance(task.exception(), WebSocketDisconnect):
+                    task.result()
+        finally:
+            # Not awaited: the server may be cancelling this session too. An action already handed to its
+            # game's actor still happens; only its reply is lost.
+            for task in (reader, writer, *self._tasks):
+                task.cancel()
+
+    def reply(self, message: dict[str, Any]):
+        self.subscriber.push(json.dumps(message))
+
+    async def _sync(self, game_id: str):
+        messages = await self.game_messages(game_id, True)
+        if not messages:
+            self.reply({"type": "error", "game_id": game_id, "error": "Game not found"})
+        for message in messages:
+            self.subscriber.push(message)
+
+    async def _read(self):
+        while True:
+            try:
+                messages = json.loads(await self.websocket.receive_text())
+            except ValueError:
+                self.reply({"type": "error", "error": "Frame is not JSON"})
+                continue
+            for message in messages if isinstance(messages, list) else [messages]:
+                if not isinstance(message, dict):
+                    self.reply({"type": "error", "error": "Message is not an object"})
+                elif message.get("type") == "action":
+                    # Concurrently, so one busy game doesn't hold up the player's others
+                    task = asyncio.create_task(self._action(message))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                elif message.get("type") == "sync":
+                    await self._sync(str(message.get("game_id")))
+                else:
+                    self.reply({"type": "error", "id": message.get("id"), "error": f"Unknown message type {message.get('type')!r}"})
+
+    async def _action(self, message: dict[str, Any]):
+        reply = {"id": message.get("id"), "game_id": message.get("game_id")}
+        try:
+            error = await self.submit(str(message.get("game_id")), message)
+        except Exception:
+            logger.exception("WebSocket action failed", extra={"game_id": message.get("game_id")})
+            error = "Internal error"
+        self.reply({"type": "ack", **reply} if error is None else {"type": "error", **reply, "error": error})
+
+    async def _write(self):
+        while (first := await self.subscriber.get_item()) is not None:
+            if self.tick:
+                # Let whatever else is about to happen (the rest of a turn's events, other replies) catch up
+                await asyncio.sleep(self.tick)
+            messages = []
+            games: dict[str, None] = {}
+            for game_id, _, data in [first, *self.subscriber.drain()]:
+                messages.append(data)
+                if game_id is not None:
+                    games[game_id] = None
+            for game_messages in await asyncio.gather(*(self.game_messages(game_id, False) for game_id in games)):
+                messages.extend(game_messages)
+            await self.websocket.send_text(frame(self.subscriber.cursor(), messages))
+        # Closed for falling behind; its last frame had the resync event
+        await self.websocket.close()
@@ -0,0 +1,230 @@
+from contextlib import closing
+from dataclasses import asdict, dataclass, field
+from typing import Any
+import json
+import random
+import sqlite3
+import threading
+
+from gamestate.config import GameConfig
+from gamestate.game_action import (
+    DiscardAction, GameAction, PlayerAction, ProtectAction, TakeAction,
+    TakeableCard, TakeableDeck, TakeableDiscard, TakeableGameObject, TakeableWager,
+)
+from gamestate.game_state import Card, Deck, DiscardPile, GameState, Hand, NotProtectableCard, Player, Stack, Wager
+from gamestate.initial_state import create_initial_state, deal_player_into_game
+from gamestate.perform import perform_random_action
+
+
+def encode_state(state: GameState) -> dict[str, Any]:
+    """The whole state, including the order of the cards left in the deck."""
+    return {
+        "players": [asdict(p) for p in state.players],
+        "deck": {"cards": [asdict(c) for c in state.deck.cards], "protected": state.deck.protected},
+    }
+
+def decode_state(data: dict[str, Any]) -> GameState:
+    return GameState(
+        players=tuple(
+            Player(
+                id=p["id"],
+                hand=Hand(cards=tuple(Card(**c) for c in p["hand"]["cards"]), protected=p["hand"]["protected"]),
+                discard_pile=DiscardPile(cards=tuple(Card(**c) for c in p["discard_pile"]["cards"]), protected=p["discard_pile"]["protected"]),
+                stack=Stack(**p["stack"]),
+                wager=Wager(**p["wager"]),
+                eliminated=p["eliminated"],
+            )
+            for p in data["players"]
+        ),
+        deck=Deck(cards=tuple(NotProtectableCard(**c) for c in data["deck"]["cards"]), protected=data["deck"]["protected"]),
+    )
+
+def decode_takeable(data: dict[str, Any]) -> TakeableGameObject:
+    types = {"card": TakeableCard, "wager": TakeableWager, "discard": TakeableDiscard, "deck": TakeableDeck}
+    return types[data["type"]](**data)
+
+def decode_player_action(data: dict[str, Any]) -> PlayerAction:
+    if data["type"] == "take":
+        return TakeAction(object_to_take=decode_takeable(data["object_to_take"]))
+    elif data["type"] == "protect":
+        return ProtectAction(object_to_protect=decode_takeable(data["object_to_protect"]))
+    elif data["type"] == "discard":
+        return DiscardAction(card_order=data["card_order"])
+    else:
+        raise ValueError(f"Unknown player action type: {data['type']}")
+
+def decode_game_action(data: dict[str, Any]) -> GameAction:
+    return GameAction(player_actions=tuple(
+        (player_id, decode_player_action(action))
+        for player_id, action in data["player_actions"]
+    ))
+
+
+@dataclass
+class RestoredGame:
+    game_id: str
+    state: GameState
+    version: int
+    bot_ids: list[str] = field(default_factory=list)
+    seed: int | None = None
+
+
+class GameStore:
+    """Where resolved game history goes. The default keeps nothing, so games only live in memory.
+
+    Every change to a game is described by a log record. The game's deck is shuffled from the seed recorded
+    when it was created and everything after is dealt off its top, so replaying the records in order
+    reproduces the game's state exactly.
+    """
+
+    def new_seed(self) -> int:
+        return random.randrange(2 ** 63)
+
+    def record_created(self, game_id: str, player_id: str, seed: int):
+        pass
+
+    def record_joined(self, game_id: str, version: int, player_id: str, bot: bool = False):
+        pass
+
+    def record_turn(self, game_id: str, version: int, action: GameAction, state: GameState):
+        pass
+
+    def record_evicted(self, game_id: str):
+        pass
+
+    def restore(self, config: GameConfig) -> list[RestoredGame]:
+        return []
+
+    def close(self):
+        pass
+
+
+def apply_record(state: GameState | None, kind: str, payload: dict[str, Any], config: GameConfig) -> GameState:
+    if kind == "created":
+        initial_state = create_initial_state(config, random.Random(payload["seed"]))
+        return deal_player_into_game(initial_state, payload["player_id"], config)
+    elif kind == "joined":
+        return deal_player_into_game(state, payload["player_id"], config)
+    elif kind == "turn":
+        return perform_random_action(state, decode_game_action(payload["action"]))
+    else:
+        raise ValueError(f"Unknown log record kind: {kind}")
+
+
+class SqliteGameStore(GameStore):
+    """Write-ahead log of game records in SQLite, with periodic snapshots.
+
+    Records are buffered and written by a background thread in one transaction per flush_interval (group
+    commit), so request handlers never wait on the disk. A crash loses at most the last flush_interval of
+    records. Every snapshot_every versions a game's state is snapshotted and its older records are dropped.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.5, snapshot_every: int = 50):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self._pending: list[tuple[str, tuple]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        with closing(self._connect()) as db, db:
+            db.execute("CREATE TABLE IF NOT EXISTS log (game_id TEXT, version INTEGER, kind TEXT, payload TEXT, PRIMARY KEY (game_id, version))")
+            db.execute("CREATE TABLE IF NOT EXISTS snapshots (game_id TEXT PRIMARY KEY, version INTEGER, state TEXT, bot_ids TEXT)")
+            # Kept apart from the log, whose created record goes once the game is snapshotted
+            db.execute("CREATE TABLE IF NOT EXISTS seeds (game_id TEXT PRIMARY KEY, seed INTEGER)")
+        self._bot_ids: dict[str, list[str]] = {}
+        self._thread = threading.Thread(target=self._run, name="game-store-writer", daemon=True)
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path)
+        db.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only syncs at checkpoints; the group commit already bounds what a crash can lose
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _append(self, game_id: str, version: int, kind: str, payload: dict[str, Any]):
+        with self._lock:
+            self._pending.append(("INSERT OR REPLACE INTO log VALUES (?, ?, ?, ?)", (game_id, version, kind, json.dumps(payload))))
+
+    def record_created(self, game_id: str, player_id: str, seed: int):
+        self._append(game_id, 0, "created", {"player_id": player_id, "seed": seed})
+        with self._lock:
+            self._pending.append(("INSERT OR REPLACE INTO seeds VALUES (?, ?)", (game_id, seed)))
+
+    def record_joined(self, game_id: str, version: int, player_id: str, bot: bool = False):
+        if bot:
+            self._bot_ids.setdefault(game_id, []).append(player_id)
+        self._append(game_id, version, "joined", {"player_id": player_id, "bot": bot})
+
+    def record_turn(self, game_id: str, version: int, action: GameAction, state: GameState):
+        self._append(game_id, version, "turn", {"action": asdict(action)})
+        if version % self.snapshot_every == 0:
+            with self._lock:
+                self._pending.append((
+                    "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)",
+                    (game_id, version, json.dumps(encode_state(state)), json.dumps(self._bot_ids.get(game_id, []))),
+                ))
+                self._pending.append(("DELETE FROM log WHERE game_id = ? AND version <= ?", (game_id, version)))
+
+    def record_evicted(self, game_id: str):
+        # An evicted game is gone for good, so it must not come back on restart either
+        self._bot_ids.pop(game_id, None)
+        with self._lock:
+            self._pending.append(("DELETE FROM log WHERE game_id = ?", (game_id,)))
+            self._pending.append(("DELETE FROM snapshots WHERE game_id = ?", (game_id,)))
+            self._pending.append(("DELETE FROM seeds WHERE game_id = ?", (game_id,)))
+
+    def restore(self, config: GameConfig) -> list[RestoredGame]:
+        games: dict[str, RestoredGame] = {}
+        with closing(self._connect()) as db:
+            for game_id, version, state, bot_ids in db.execute("SELECT game_id, version, state, bot_ids FROM snapshots"):
+                games[game_id] = RestoredGame(game_id, decode_state(json.loads(state)), version, json.loads(bot_ids))
+            for game_id, version, kind, payload in db.execute("SELECT game_id, version, kind, payload FROM log ORDER BY game_id, version"):
+                game = games.get(game_id)
+                if game is not None and version <= game.version:
+                    continue
+                payload = json.loads(payload)
+                state = apply_record(game.state if game else None, kind, payload, config)
+                if game is None:
+                    game = games[game_id] = RestoredGame(game_id, state, version)
+                game.state, game.version = state, version
+                if payload.get("bot"):
+                    game.bot_ids.append(payload["player_id"])
+            for game_id, seed in db.execute("SELECT game_id, seed FROM seeds"):
+                if game_id in games:
+                    games[game_id].seed = seed
+        for game in games.values():
+            self._bot_ids[game.game_id] = list(game.bot_ids)
+        return list(games.values())
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        with closing(self._connect()) as db, db:
+            for statement, params in pending:
+                db.execute(statement, params)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+
+def open_store(storage_config: dict[str, Any]) -> GameStore:
+    backend = storage_config.get("backend", "memory")
+    if backend == "memory":
+        return GameStore()
+    elif backend == "sqlite":
+        return SqliteGameStore(
+            storage_config.get("path", "games.db"),
+            flush_interval=storage_config.get("flush_interval", 0.5),
+            snapshot_every=storage_config.get("snapshot_every", 50),
+        )
+    else:
+        raise ValueError(f"Unknown storage backend: {backend}")
@@ -26,8 +26,10 @@ export interface IErrorResponse {
 }
 
 export type IEvent =
-    | { game_id: string; action: any; type: "actions_performed" }
-    | { game_id: string; player_id: string; type: "player_joined" };
+    | { game_id: string; action: any; version: number; delta: any; type: "actions_performed" }
+    | { game_id: string; player_id: string; version: number; delta: any; type: "player_joined" }
+    // Events were missed (of game_id, or of any game without one); refetch the game state
+    | { game_id?: string; type: "resync" };
 
 
 // --- API Wrappers ---
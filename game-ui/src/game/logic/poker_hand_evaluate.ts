@@ -34,31 +34,28 @@ function evaluateHand(hand: Hand): EvaluatedHand {
     for (const r of ranks) rankCounts[r] = (rankCounts[r] || 0) + 1;
     const counts = Object.values(rankCounts).sort((a, b) => b - a);
     const uniqueRanks = Object.keys(rankCounts).map(Number).sort((a, b) => b - a);
+    // Ties are broken on ranks by how many of them there are, then by rank: the pair before the kickers
+    const grouped = [...uniqueRanks].sort((a, b) => rankCounts[b] - rankCounts[a] || b - a);
 
     const isFlush = hand.length >= 3 && suits.every(s => s === suits[0]);
-    const isStraight = hand.length >= 3 && (
+    // Aces are rank 1 and play low, like everywhere else: A-2-3-4-5 is the lowest straight, topped by
+    // the 5, and no straight wraps around from the King to the Ace
+    const isStraight = hand.length >= 3 &&
         uniqueRanks.length === hand.length &&
-        (uniqueRanks[0] - uniqueRanks[uniqueRanks.length - 1] === hand.length - 1 ||
-            // Handle Ace-low straight
-            (uniqueRanks.includes(13) && uniqueRanks.includes(1) &&
-                uniqueRanks.slice(1).every((r, i) => r === 5 - i)))
-    );
+        uniqueRanks[0] - uniqueRanks[uniqueRanks.length - 1] === hand.length - 1;
 
+    // Must agree with rank_hand in game-server/gamestate/evaluate.py, which decides showdowns
     if (hand.length >= 3) {
         if (isStraight && isFlush) return { rank: HandRank.StraightFlush, tiebreakers: [Math.max(...ranks)] };
-        if (counts[0] === 4) return { rank: HandRank.FourOfAKind, tiebreakers: [uniqueRanks[0], ...uniqueRanks.slice(1)] };
-        if (counts[0] === 3 && counts[1] === 2) return { rank: HandRank.FullHouse, tiebreakers: [uniqueRanks[0], uniqueRanks[1]] };
+        if (counts[0] >= 4) return { rank: HandRank.FourOfAKind, tiebreakers: grouped };
+        if (counts[0] >= 3 && counts[1] >= 2) return { rank: HandRank.FullHouse, tiebreakers: grouped.slice(0, 2) };
         if (isFlush) return { rank: HandRank.Flush, tiebreakers: ranks };
         if (isStraight) return { rank: HandRank.Straight, tiebreakers: [Math.max(...ranks)] };
-        if (counts[0] === 3) return { rank: HandRank.ThreeOfAKind, tiebreakers: [uniqueRanks[0], ...uniqueRanks.slice(1)] };
-        if (counts[0] === 2 && counts[1] === 2) return { rank: HandRank.TwoPair, tiebreakers: [uniqueRanks[0], uniqueRanks[1], ...uniqueRanks.slice(2)] };
-        if (counts[0] === 2) return { rank: HandRank.Pair, tiebreakers: [uniqueRanks[0], ...uniqueRanks.slice(1)] };
-        return { rank: HandRank.HighCard, tiebreakers: ranks };
-    } else {
-        if (counts[0] === 3) return { rank: HandRank.ThreeOfAKind, tiebreakers: [uniqueRanks[0], ...uniqueRanks.slice(1)] };
-        if (counts[0] === 2) return { rank: HandRank.Pair, tiebreakers: [uniqueRanks[0], ...uniqueRanks.slice(1)] };
-        return { rank: HandRank.HighCard, tiebreakers: ranks };
     }
+    if (counts[0] >= 3) return { rank: HandRank.ThreeOfAKind, tiebreakers: grouped };
+    if (counts[0] === 2 && counts[1] === 2) return { rank: HandRank.TwoPair, tiebreakers: grouped };
+    if (counts[0] === 2) return { rank: HandRank.Pair, tiebreakers: grouped };
+    return { rank: HandRank.HighCard, tiebreakers: ranks };
 }
 
 function compareHands(handA: Hand, handB: Hand): number {
@@ -98,21 +95,11 @@ function handDescription(eh: EvaluatedHand): string {
     }
 }
 
-function compareHandsWithMessage(handA: Hand, handB: Hand): { result: number, message: string } {
+// With result given (e.g. the server's showdown), only describes the hands
+function compareHandsWithMessage(handA: Hand, handB: Hand, result?: number): { result: number, message: string } {
     const evalA = evaluateHand(handA);
     const evalB = evaluateHand(handB);
-    let result = 0;
-    if (evalA.rank !== evalB.rank) result = evalA.rank > evalB.rank ? 1 : -1;
-    else {
-        for (let i = 0; i < Math.max(evalA.tiebreakers.length, evalB.tiebreakers.length); i++) {
-            const a = evalA.tiebreakers[i] || 0;
-            const b = evalB.tiebreakers[i] || 0;
-            if (a !== b) {
-                result = a > b ? 1 : -1;
-                break;
-            }
-        }
-    }
+    if (result === undefined) result = compareHands(handA, handB);
     const descA = handDescription(evalA);
     const descB = handDescription(evalB);
     let message: string;
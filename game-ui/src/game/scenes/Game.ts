@@ -194,7 +194,7 @@ export class Game extends Scene {
 
     renderGameState(state: IGameState) {
         // 0 being falsy is intentional here
-        if (state.deck?.cards?.length) {
+        if (state.deck?.size) {
             this.gameObjects.deck = FaceDownCard(
                 this,
                 center(this.neutralAreaBound).x,
@@ -308,7 +308,7 @@ export class Game extends Scene {
                 const spacing = Math.min(75, boundWidth(this.opponentPlayerBound) / (cardCount + 1));
                 const startX = center(this.opponentPlayerBound).x - (spacing * (cardCount - 1)) / 2;
                 for (let i = 0; i < cardCount; i++) {
-                    if (this.gameState.deck?.cards?.length !== 0) {
+                    if (this.gameState.deck?.size !== 0) {
                         const card = FaceDownCard(
                             this,
                             startX + i * spacing,
@@ -438,10 +438,14 @@ export class Game extends Scene {
             this.destroyOldGameObjects();
             this.renderGameState(new_state);
 
-            if (this.gameState.deck?.cards?.length === 0) {
+            if (this.gameState.deck?.size === 0) {
                 const thisPlayerHand = this.getThisPlayerState(new_state)?.hand?.cards.map(c => [c.rank, c.suit] as [number, number]) || [];
                 const opponentPlayerHand = this.getOpponentPlayerState(new_state)?.hand?.cards.map(c => [c.rank, c.suit] as [number, number]) || [];
-                const output = compareHandsWithMessage(thisPlayerHand, opponentPlayerHand)
+                const winners = new_state.showdown ?? [];
+                const thisPlayerId = this.getThisPlayerState(new_state)?.id;
+                // The server decides the showdown; the hands are only evaluated here to describe them
+                const result = !thisPlayerId || !winners.includes(thisPlayerId) ? -1 : winners.length > 1 ? 0 : 1;
+                const output = compareHandsWithMessage(thisPlayerHand, opponentPlayerHand, result)
                 alert(output.message)
             }
         });
@@ -9,7 +9,8 @@ export interface ICard extends INotProtectableCard {
 }
 
 export interface IDeck {
-    cards: INotProtectableCard[];
+    // Only the number of cards left; their order is hidden from players
+    size: number;
     protected: boolean;
 }
 
@@ -44,6 +45,8 @@ export interface IPlayer {
 export interface IGameState {
     players: IPlayer[];
     deck: IDeck;
+    // Once the deck is empty, the ids of the players with the best hand (several for a tie)
+    showdown?: string[] | null;
 }
 
 export type ITakeableObject =